@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# Time the generators on synthetic APIs of growing size, and check that their
+# run time grows linearly with it. Each API is built with the AST classes:
+# class hierarchies of the given depth, spread over nested namespaces, with
+# methods (some of them taking strings), and enums used by free functions.
+#
+# The scaling exponent between two sizes is log(t2 / t1) / log(n2 / n1),
+# about 1 for linear phases and 2 for quadratic ones. The benchmark fails
+# when any phase goes above --max-exponent.
+import gc
+import json
+import math
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from bindgen.ast import objects as obj
+from bindgen.gen import GENERATORS, MemorySink
+
+def build(classes, methods=5, depth=3, enums=10, strings=1, namespaces=4, nesting=2):
+    root = obj.Namespace()
+
+    # Classes go in the innermost namespaces, in turn
+    leaves = []
+    for n in range(namespaces):
+        ns = root.Namespace('ns%d' % (n))
+        for level in range(1, nesting):
+            ns = ns.Namespace('sub%d' % (level))
+        leaves.append(ns)
+
+    last = [None] * len(leaves)
+    for i in range(classes):
+        leaf = i % len(leaves)
+        ns = leaves[leaf]
+
+        # Each hierarchy starts with a constructible, destructible class
+        if (i // len(leaves)) % depth == 0:
+            cls = ns.Class('C%d' % (i))
+            cls.add_body_item('ctor', obj.Constructor((obj.Int, 'x')))
+            cls.add_body_item('dtor', obj.Destructor())
+        else:
+            cls = ns.Class('C%d' % (i), last[leaf])
+        last[leaf] = cls
+
+        for m in range(methods):
+            args = [(obj.Int, 'x')]
+            if m < strings:
+                args.append((obj.String(const=True), 's'))
+
+            cls.add_body_item('m%d' % (m), obj.Method(obj.ptr(cls), *args, const=(m % 2 == 0)))
+
+    for j in range(classes * enums // 100):
+        ns = leaves[j % len(leaves)]
+
+        enum = obj.Enum(values=['A', ('B', 3), 'C'])
+        ns.add_body_item('E%d' % (j), enum)
+        ns.add_body_item('use_e%d' % (j), obj.Function(obj.Void, (enum, 'e')))
+
+    return root
+
+# Best time of each phase over `repeat` runs, each on a freshly built API
+def run(classes, repeat, **options):
+    best = {}
+    entities = 0
+
+    def timed(name, func, *args, **kwargs):
+        gc.collect()
+
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        best[name] = min(best.get(name, elapsed), elapsed)
+        return result
+
+    for _ in range(repeat):
+        root = timed('build', build, classes, **options)
+        ir = timed('seal', root.seal)
+        entities = len(ir)
+
+        # Generators share the sealed tree, as in a real run
+        for Generator in GENERATORS:
+            gen = Generator(root)
+            gen.sink = MemorySink()
+            timed(Generator.__name__, gen.generate, Path(gen.sink.dest))
+
+        del root, ir, gen
+
+    return {'classes': classes, 'entities': entities, 'seconds': best}
+
+def exponents(results, min_time):
+    checks = []
+
+    for (small, large) in zip(results, results[1:]):
+        for (phase, t1) in small['seconds'].items():
+            t2 = large['seconds'][phase]
+
+            # Timings this short are mostly noise
+            if t1 < min_time:
+                continue
+
+            exponent = math.log(t2 / t1) / math.log(large['entities'] / small['entities'])
+            checks.append({
+                'phase': phase,
+                'from': small['classes'],
+                'to': large['classes'],
+                'exponent': exponent,
+            })
+
+    return checks
+
+def main(args):
+    options = dict(methods=args.methods, depth=args.depth, enums=args.enums, strings=args.strings,
+                   namespaces=args.namespaces, nesting=args.nesting)
+
+    results = []
+    for classes in sorted(args.sizes):
+        result = run(classes, args.repeat, **options)
+        results.append(result)
+
+        seconds = result['seconds']
+        print('%6d classes, %7d entities: %s' % (classes, result['entities'],
+              ', '.join('%s %.3fs' % (phase, t) for (phase, t) in seconds.items())))
+
+    checks = exponents(results, args.min_time)
+    failures = [check for check in checks if check['exponent'] > args.max_exponent]
+
+    for check in failures:
+        print('%s scales super-linearly from %d to %d classes (exponent %.2f)'
+              % (check['phase'], check['from'], check['to'], check['exponent']))
+
+    with open(str(args.output), 'w') as f:
+        json.dump({
+            'options': dict(options, repeat=args.repeat),
+            'results': results,
+            'exponents': checks,
+            'failures': failures,
+        }, f, indent=2)
+        f.write('\n')
+
+    print('Results written to %s' % (args.output))
+    return 1 if len(failures) > 0 else 0
+
+def sizes(value):
+    return [int(size) for size in value.split(',')]
+
+# Main
+parser = ArgumentParser()
+parser.add_argument('--sizes', type=sizes, default=[100, 1000, 10000], metavar='N,N,...',
+                    help='Numbers of classes to generate, e.g. 100,1000,10000,50000')
+parser.add_argument('--methods', type=int, default=5, help='Methods per class')
+parser.add_argument('--depth', type=int, default=3, help='Classes per hierarchy')
+parser.add_argument('--enums', type=int, default=10, help='Enums per 100 classes')
+parser.add_argument('--strings', type=int, default=1, help='Methods per class taking a string')
+parser.add_argument('--namespaces', type=int, default=4, help='Top-level namespaces')
+parser.add_argument('--nesting', type=int, default=2, help='Depth of the namespaces')
+parser.add_argument('-r', '--repeat', type=int, default=3)
+parser.add_argument('-o', '--output', type=Path, default=Path('bench-generators.json'))
+parser.add_argument('--max-exponent', type=float, default=1.5,
+                    help='Fail when a phase scales with a higher exponent')
+parser.add_argument('--min-time', type=float, default=0.05,
+                    help='Ignore the scaling of phases faster than this (in seconds)')
+
+if __name__ == '__main__':
+    exit(main(parser.parse_args()))
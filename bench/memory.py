@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# Report the memory used per AST entity by the classes of the working tree (or
+# of --revision), against the classes of a baseline revision (by default the
+# first commit, whose classes all have a per-instance __dict__). Each side is
+# measured in its own process, importing bindgen from the working tree or from
+# `git archive` of the revision.
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Build a fresh instance, bypassing type interning
+def build(ty, *args, **kwargs):
+    item = ty.__new__(ty)
+    ty.__init__(item, *args, **kwargs)
+    return item
+
+def make_cases():
+    from bindgen.ast import objects as obj
+
+    cls = obj.Class('Value')
+
+    return [
+        ('Function', obj.Function, lambda ty: build(ty, obj.Int, (obj.Int, 'x'))),
+        ('Method', obj.Method, lambda ty: build(ty, obj.Void, (obj.Int, 'x'), const=True)),
+        ('Constructor', obj.Constructor, lambda ty: build(ty, (obj.Int, 'x'))),
+        ('Class', obj.Class, lambda ty: build(ty, 'Value')),
+        ('Enum', obj.Enum, lambda ty: build(ty, values=['A', 'B'])),
+        ('Pointer', obj.Pointer, lambda ty: build(ty, cls, const=True)),
+        ('Ref', obj.Ref, lambda ty: build(ty, cls)),
+        ('Option', obj.Option, lambda ty: build(ty, cls)),
+        ('BuiltinType', obj.BuiltinType, lambda ty: build(ty, 'int', '::libc::c_int', 'i32')),
+        ('String', obj.String, lambda ty: build(ty, const=True)),
+    ]
+
+# Bytes per instance, including the containers it owns
+def measure(make, ty, count):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [make(ty) for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    # Don't count the list holding the instances
+    size = after - before - items.__sizeof__()
+    return size / count
+
+# Measures the bindgen found on sys.path, prints {entity: bytes} as JSON
+def measure_all(count):
+    sizes = {name: measure(make, ty, count) for (name, ty, make) in make_cases()}
+    print(json.dumps(sizes))
+
+def run_measure(path, count):
+    env = dict(os.environ, PYTHONPATH=path)
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--measure', '-n', str(count)],
+                                     env=env, cwd=path)
+    return json.loads(output)
+
+# Measures the bindgen of a revision, checked out in `tmp`
+def run_measure_revision(rev, tmp, count):
+    archive = os.path.join(tmp, 'bindgen.tar')
+    subprocess.check_call(['git', 'archive', '-o', archive, rev, 'bindgen'], cwd=ROOT)
+
+    src = os.path.join(tmp, rev)
+    with tarfile.open(archive) as tar:
+        tar.extractall(src)
+
+    return run_measure(src, count)
+
+def first_commit():
+    output = subprocess.check_output(['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=ROOT)
+    return output.decode().split()[-1]
+
+def main(args):
+    if args.measure:
+        measure_all(args.count)
+        return
+
+    baseline = args.baseline or first_commit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run_measure_revision(baseline, tmp, args.count)
+
+        if args.revision is None:
+            after = run_measure(ROOT, args.count)
+        else:
+            after = run_measure_revision(args.revision, tmp, args.count)
+
+    print('Bytes per instance, %s against %s' % (args.revision or 'working tree', baseline))
+    print('%-12s %12s %12s %8s' % ('entity', 'before (B)', 'after (B)', 'saved'))
+
+    small = []
+    for (name, size) in after.items():
+        saved = 1 - size / before[name]
+        print('%-12s %12.1f %12.1f %7.1f%%' % (name, before[name], size, saved * 100))
+
+        if saved < args.threshold:
+            small.append(name)
+
+    if len(small) > 0:
+        print()
+        print('Saved less than %d%%: %s.' % (args.threshold * 100, ', '.join(small)))
+        print('Module subclasses (Class, Namespace) keep a __dict__ for body attributes,')
+        print('and a slot for each of their indexes and caches, even while unset.')
+
+# Main
+parser = ArgumentParser()
+parser.add_argument('-n', '--count', type=int, default=10000)
+parser.add_argument('--baseline', metavar='REV',
+                    help='Revision to compare against, the first commit by default')
+parser.add_argument('--revision', metavar='REV',
+                    help='Revision to measure, the working tree by default')
+parser.add_argument('--threshold', type=float, default=0.05,
+                    help='Point out the entities saving less than this (a fraction)')
+parser.add_argument('--measure', action='store_true',
+                    help='Only measure the bindgen found on the path, as JSON')
+
+if __name__ == '__main__':
+    main(parser.parse_args())
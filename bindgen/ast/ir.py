@@ -0,0 +1,472 @@
+import bisect
+import enum
+import hashlib
+from .utils import get_modpath, resolve_modpaths
+from bindgen.gen import utils as gen_utils
+
+class Kind(enum.IntEnum):
+    ENTITY = 0
+    MODULE = 1
+    NAMESPACE = 2
+    CLASS = 3
+    ENUM = 4
+    FUNCTION = 5
+    METHOD = 6
+    STATIC_METHOD = 7
+    CONSTRUCTOR = 8
+    DESTRUCTOR = 9
+    RAW_FUNCTION = 10
+
+    @property
+    def is_module(self):
+        return self in (Kind.MODULE, Kind.NAMESPACE, Kind.CLASS)
+
+    @property
+    def is_function(self):
+        return Kind.FUNCTION <= self <= Kind.DESTRUCTOR
+
+def get_kind(item):
+    from . import objects as obj
+
+    # Most specific classes first
+    kinds = [
+        (obj.Destructor, Kind.DESTRUCTOR),
+        (obj.Constructor, Kind.CONSTRUCTOR),
+        (obj.StaticMethod, Kind.STATIC_METHOD),
+        (obj.Method, Kind.METHOD),
+        (obj.Function, Kind.FUNCTION),
+        (obj.RawFunction, Kind.RAW_FUNCTION),
+        (obj.Enum, Kind.ENUM),
+        (obj.Class, Kind.CLASS),
+        (obj.Namespace, Kind.NAMESPACE),
+        (obj.Module, Kind.MODULE),
+    ]
+
+    for (cls, kind) in kinds:
+        if isinstance(item, cls):
+            return kind
+    return Kind.ENTITY
+
+# Name of the safe wrapper of a function in the Rust FFI module
+def get_rust_ffi_name(func, kind=None):
+    if kind is None:
+        kind = get_kind(func)
+
+    if kind == Kind.FUNCTION:
+        return func.name
+    return gen_utils.c_name(func.frozen_path[-2:])
+
+# Immutable lowering of an AST root. Entities are numbered in pre-order
+# traversal order (the order of Module.traverse), and every column is a
+# tuple indexed by entity ID. Types get their own IDs, in order of first use.
+class SealedTree(object):
+    NO_ID = -1
+
+    def __init__(self, root):
+        from . import objects as obj
+
+        self.root = root
+
+        # Read once traversed, traversing materializes lazy bodies
+        entities = root.traversal
+        self.revision = obj.Module.revision
+        self.entities = entities
+        self.ids = {entity: i for (i, entity) in enumerate(entities)}
+
+        self._types = []
+        self.type_ids = {}
+
+        kinds = []
+        parents = []
+        namespaces = []
+        children = []
+        includes = []
+        module_types = []
+        ret_types = []
+        arg_types = []
+        rust_ffi_names = []
+
+        for entity in entities:
+            kind = get_kind(entity)
+            kinds.append(kind)
+
+            # Parents always come before their children
+            parent = self.ids.get(entity.parent, self.NO_ID)
+            parents.append(parent)
+            if parent == self.NO_ID:
+                namespaces.append(self.NO_ID)
+            elif kinds[parent] == Kind.NAMESPACE:
+                namespaces.append(parent)
+            else:
+                namespaces.append(namespaces[parent])
+
+            if kind.is_module:
+                children.append(tuple(self.ids[item] for item in entity.ordered_items))
+                includes.append(frozenset(entity.includes))
+                module_types.append(tuple(self._type_id(ty) for ty in entity.types))
+            else:
+                children.append(())
+                includes.append(frozenset())
+                module_types.append(())
+
+            if kind.is_function:
+                ret_types.append(self._type_id(entity.ret_ty))
+                arg_types.append(tuple((self._type_id(ty), name) for (ty, name) in entity.arg_tys))
+
+                rust_ffi_names.append(get_rust_ffi_name(entity, kind))
+            else:
+                ret_types.append(self.NO_ID)
+                arg_types.append(())
+                rust_ffi_names.append(None)
+
+            if kind in (Kind.CLASS, Kind.ENUM):
+                self._type_id(entity)
+
+        # The subtree of entity i spans the IDs [i, ends[i])
+        ends = list(range(1, len(entities) + 1))
+        for i in reversed(range(len(entities))):
+            if len(children[i]) > 0:
+                ends[i] = ends[children[i][-1]]
+
+        self.kinds = tuple(kinds)
+        self.parents = tuple(parents)
+        self.namespaces = tuple(namespaces)
+        self.children = tuple(children)
+        self.ends = tuple(ends)
+        self.includes = tuple(includes)
+        self.module_types = tuple(module_types)
+        self.ret_types = tuple(ret_types)
+        self.arg_types = tuple(arg_types)
+        self.rust_ffi_names = tuple(rust_ffi_names)
+
+        self.names = tuple(entity.name for entity in entities)
+
+        # Entities don't keep their paths, each one extends its parent's
+        paths = []
+        for (entity, parent, name) in zip(entities, parents, self.names):
+            path = entity.frozen_path if parent == self.NO_ID else paths[parent]
+            if parent != self.NO_ID and name is not None:
+                path += (name,)
+            paths.append(path)
+
+        self.paths = tuple(paths)
+        self.c_names = tuple(gen_utils.c_name(path) for path in paths)
+        self.cpp_names = tuple(gen_utils.cpp_name(path) for path in paths)
+
+        modpaths = resolve_modpaths(entity for (entity, kind) in zip(entities, kinds) if self._has_modpath(kind))
+        self.modpaths = tuple(modpaths.get(entity) for entity in entities)
+
+        # Entity IDs sorted by name, ties kept in traversal order
+        self.by_name = tuple(sorted(range(len(entities)), key=lambda i: self.names[i]))
+
+        # Type columns, resolving def_type may register new types
+        def_types = []
+        while len(def_types) < len(self._types):
+            ty = self._types[len(def_types)]
+            def_types.append(self._type_id(ty.def_type))
+
+        self.types = tuple(self._types)
+        self.def_types = tuple(def_types)
+        self.type_c_names = tuple(ty.ffi_name('c') for ty in self.types)
+        self.type_rust_names = tuple(ty.ffi_name('rust') for ty in self.types)
+
+        # Resolved type names, see ffi_name()
+        self._names = {}
+        for (ty, c_name, rust_name) in zip(self.types, self.type_c_names, self.type_rust_names):
+            self._names[('ffi_name', ty, 'c')] = c_name
+            self._names[('ffi_name', ty, 'rust')] = rust_name
+
+        del self._types
+
+        self._local_fingerprints = None
+        self._fingerprints = None
+        self._opaque = None
+        self._emissions = {}
+
+    def _type_id(self, ty):
+        tid = self.type_ids.get(ty)
+        if tid is None:
+            tid = len(self._types)
+            self._types.append(ty)
+            self.type_ids[ty] = tid
+        return tid
+
+    def _has_modpath(self, kind):
+        return kind in (Kind.NAMESPACE, Kind.CLASS, Kind.ENUM, Kind.FUNCTION)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def of_kind(self, *kinds):
+        return [i for (i, kind) in enumerate(self.kinds) if kind in kinds]
+
+    def id_of(self, entity):
+        return self.ids.get(entity, self.NO_ID)
+
+    # Entity accessors, falling back on the AST for entities which were not sealed
+    def c_name(self, entity):
+        i = self.ids.get(entity)
+        return entity.qualified_c_name if i is None else self.c_names[i]
+
+    def cpp_name(self, entity):
+        i = self.ids.get(entity)
+        return entity.qualified_cpp_name if i is None else self.cpp_names[i]
+
+    def path(self, entity):
+        i = self.ids.get(entity)
+        return entity.frozen_path if i is None else self.paths[i]
+
+    def namespace(self, entity):
+        i = self.ids.get(entity)
+        return entity.namespace if i is None else self.entities[self.namespaces[i]]
+
+    def rust_ffi_name(self, func):
+        i = self.ids.get(func)
+        return get_rust_ffi_name(func) if i is None else self.rust_ffi_names[i]
+
+    def modpath(self, entity):
+        i = self.ids.get(entity)
+        if i is None or self.modpaths[i] is None:
+            return tuple(get_modpath(entity))
+        return self.modpaths[i]
+
+    # Type names, memoized by (type, language, context) for every generator
+    # of this tree. Names are absolute, so a Rust lib `tree` context is
+    # keyed by its root.
+    def ffi_name(self, ty, lang, **kwargs):
+        return self._type_name('ffi_name', ty, lang, kwargs)
+
+    def lib_name(self, ty, lang, **kwargs):
+        return self._type_name('lib_name', ty, lang, kwargs)
+
+    def _type_name(self, meth, ty, lang, kwargs):
+        if len(kwargs) == 0:
+            key = (meth, ty, lang)
+        else:
+            context = []
+            for (name, value) in sorted(kwargs.items()):
+                if name == 'tree':
+                    value = value.root
+                elif isinstance(value, list):
+                    value = tuple(value)
+                context.append((name, value))
+
+            key = (meth, ty, lang, tuple(context))
+
+        try:
+            name = self._names.get(key)
+        except TypeError:
+            # Unhashable type or context
+            return getattr(ty, meth)(lang, **kwargs)
+
+        if name is None:
+            name = getattr(ty, meth)(lang, **kwargs)
+            self._names[key] = name
+        return name
+
+    def arg_tys(self, func):
+        i = self.ids.get(func)
+        if i is None:
+            return func.arg_tys
+        return [(self.types[tid], name) for (tid, name) in self.arg_types[i]]
+
+    def ret_ty(self, func):
+        i = self.ids.get(func)
+        return func.ret_ty if i is None else self.types[self.ret_types[i]]
+
+    # Structural fingerprints. An entity's local fingerprint covers what is
+    # emitted for it (names, types, flags, includes, realname, modpath...),
+    # its fingerprint also covers its children's, so that equal fingerprints
+    # mean equal subtrees.
+    @property
+    def local_fingerprints(self):
+        if self._local_fingerprints is None:
+            self._local_fingerprints = tuple(_digest(self._local_key(i)) for i in range(len(self.entities)))
+        return self._local_fingerprints
+
+    @property
+    def fingerprints(self):
+        if self._fingerprints is None:
+            local = self.local_fingerprints
+            fingerprints = [None] * len(self.entities)
+
+            # Children come after their parent in pre-order
+            for i in reversed(range(len(self.entities))):
+                children = self.children[i]
+                if len(children) == 0:
+                    fingerprints[i] = local[i]
+                else:
+                    fingerprints[i] = _digest((local[i],) + tuple(fingerprints[child] for child in children))
+
+            self._fingerprints = tuple(fingerprints)
+        return self._fingerprints
+
+    # Whether a subtree holds raw functions, whose output is arbitrary code
+    # that fingerprints cannot account for
+    @property
+    def opaque(self):
+        if self._opaque is None:
+            opaque = [kind == Kind.RAW_FUNCTION for kind in self.kinds]
+
+            for i in reversed(range(len(self.entities))):
+                opaque[i] = opaque[i] or any(opaque[child] for child in self.children[i])
+
+            self._opaque = tuple(opaque)
+        return self._opaque
+
+    # What the FFI generators emit, collected in a single pass over the
+    # entities, see Emission. Only the type of the classes and enums whose
+    # kind is in `own_types` is collected, along with the types of the other
+    # modules and of the functions.
+    def emission(self, by_name=False, own_types=(Kind.CLASS,)):
+        key = (by_name, own_types)
+        emission = self._emissions.get(key)
+        if emission is None:
+            emission = Emission(self, self.by_name if by_name else range(len(self.entities)), own_types)
+            self._emissions[key] = emission
+        return emission
+
+    # Whether entity `i` is in the subtree of entity `ancestor`
+    def is_within(self, i, ancestor):
+        return ancestor <= i < self.ends[ancestor]
+
+    def fingerprint(self, entity):
+        return self.fingerprints[self.ids[entity]]
+
+    # Fingerprint of every entity, by path
+    def fingerprint_map(self):
+        return {'::'.join(path): fingerprint for (path, fingerprint) in zip(self.paths, self.fingerprints)}
+
+    # IDs of the entities whose fingerprint differs from the one in `old`
+    # (as returned by fingerprint_map), ancestors included. Unchanged
+    # subtrees are skipped as a whole.
+    def changed(self, old):
+        changed = []
+        stack = [0] if len(self.entities) > 0 else []
+
+        while len(stack) > 0:
+            i = stack.pop()
+            if old.get('::'.join(self.paths[i])) == self.fingerprints[i]:
+                continue
+
+            changed.append(i)
+            stack.extend(reversed(self.children[i]))
+
+        return changed
+
+    def _local_key(self, i):
+        entity = self.entities[i]
+        kind = self.kinds[i]
+
+        key = [kind.name, type(entity).__module__, type(entity).__qualname__, self.names[i], self.modpaths[i]]
+
+        if kind.is_module:
+            key += [sorted(self.includes[i]), [self._type_key(self.types[ty]) for ty in self.module_types[i]]]
+
+        if kind == Kind.CLASS:
+            hierarchy = self.root.hierarchy
+            destructor = hierarchy.destructor(entity)
+
+            key += [
+                entity.cpp_name,
+                [base.frozen_path for base in entity.bases],
+                [up.frozen_path for up in hierarchy.upclasses(entity)],
+                [down.frozen_path for down in hierarchy.downclasses(entity)],
+                None if destructor is None else destructor.frozen_path,
+            ]
+        elif kind == Kind.ENUM:
+            key += [entity.values]
+        elif kind.is_function:
+            key += [
+                entity.call_name,
+                self._type_key(self.types[self.ret_types[i]]),
+                [(self._type_key(self.types[ty]), name) for (ty, name) in self.arg_types[i]],
+                getattr(entity, 'const', None),
+                getattr(entity, 'null', None),
+            ]
+
+        return key
+
+    # Types are keyed by structure, and the classes and enums they refer to
+    # by the names under which they are emitted
+    def _type_key(self, ty):
+        from . import objects as obj
+
+        if isinstance(ty, obj.Class):
+            # Owned wrappers are only emitted for destructible classes
+            destructible = self.root.hierarchy.destructor(ty) is not None
+            return ('Class', ty.frozen_path, ty.cpp_name, self.modpath(ty), destructible)
+        elif isinstance(ty, obj.Enum):
+            return ('Enum', ty.frozen_path, self.modpath(ty))
+        elif isinstance(ty, obj.InternedType):
+            args = tuple(self._type_key(arg) if isinstance(arg, obj.ty._Type) else arg for arg in ty._args())
+            return (type(ty).__qualname__,) + args
+
+        return (type(ty).__module__, type(ty).__qualname__)
+
+# Entities and types collected by SealedTree.emission(), each list in the
+# order it was given. `types` holds the unique definition type IDs in order of
+# first use, `functions` the functions and raw functions, and `walk` the
+# namespaces and functions in traversal order, which is the order they are
+# nested in.
+class Emission(object):
+    def __init__(self, ir, order, own_types):
+        self._ends = ir.ends
+
+        includes = set()
+        types = []
+        functions = []
+        raw_functions = []
+        enums = []
+        namespaces = []
+
+        seen = set()
+        def add_type(tid):
+            tid = ir.def_types[tid]
+            if tid not in seen:
+                seen.add(tid)
+                types.append(tid)
+
+        for i in order:
+            kind = ir.kinds[i]
+
+            if kind.is_function:
+                functions.append(i)
+
+                add_type(ir.ret_types[i])
+                for (tid, arg_name) in ir.arg_types[i]:
+                    add_type(tid)
+                continue
+            elif kind == Kind.RAW_FUNCTION:
+                functions.append(i)
+                raw_functions.append(i)
+                continue
+
+            if kind.is_module:
+                includes |= ir.includes[i]
+            if kind == Kind.NAMESPACE and i != 0:
+                namespaces.append(i)
+            elif kind == Kind.ENUM:
+                enums.append(i)
+
+            if kind in own_types:
+                add_type(ir.type_ids[ir.entities[i]])
+            elif kind.is_module:
+                for tid in ir.module_types[i]:
+                    add_type(tid)
+
+        self.includes = frozenset(includes)
+        self.types = tuple(types)
+        self.functions = tuple(functions)
+        self.raw_functions = tuple(raw_functions)
+        self.enums = tuple(enums)
+        self.namespaces = tuple(namespaces)
+        self.walk = tuple(sorted(namespaces + functions))
+
+    # The part of `walk` below entity `i`, in its subtree
+    def walk_within(self, i):
+        walk = self.walk
+        return walk[bisect.bisect_right(walk, i):bisect.bisect_left(walk, self._ends[i])]
+
+def _digest(key):
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
@@ -0,0 +1,374 @@
+import json
+import os
+import re
+from . import objects as obj
+
+# Declarative descriptions, an alternative to Python description modules.
+#
+# A description is a sequence of records, applied in order. Every record has
+# a `kind` and a `name`, which is the path of the item from the root
+# (`llvm::sys`). Names must be declared before they are referenced, and a
+# namespace or class record may be repeated to add more members to it.
+#
+#   {"kind": "namespace", "name": "llvm", "includes": ["llvm/IR/Value.h"]}
+#   {"kind": "class", "name": "llvm::User", "bases": ["llvm::Value"], "members": [
+#       {"kind": "method", "name": "getOperand", "ret": {"kind": "ptr", "to": "llvm::Value"},
+#        "args": [["unsigned int", "i"]]},
+#       {"kind": "ctor", "args": [{"kind": "ref", "to": "llvm::LLVMContext"}], "null": "catch"},
+#       {"kind": "dtor"}]}
+#   {"kind": "function", "name": "llvm::sys::getHostCPUName", "ret": "string"}
+#   {"kind": "enum", "name": "llvm::Value::Kind", "values": ["A", ["B", 3]]}
+#
+# Types are either names (builtin C++ types, `bool`, `string`, or the path of
+# a class or enum), or records:
+#
+#   {"kind": "ptr", "to": T, "const": false, "owned": false, "null": "option" | "panic" | "none"}
+#   {"kind": "ref", "to": T, "const": false}
+#   {"kind": "option", "to": T, "default": null}
+#   {"kind": "string", "const": false}
+#   {"kind": "option_string", "const": false}
+#
+# `.jsonl` files hold one record per line and are read line by line, `.json`
+# files hold an array of records, read in chunks and decoded one record at a
+# time, and `.toml` files hold an array of `[[item]]` tables (read whole).
+# Nothing in a description is executed, and loading is linear in its size.
+
+FORMATS = ('.json', '.jsonl', '.ndjson', '.toml')
+
+# Characters read at once from `.json` files
+JSON_CHUNK_SIZE = 1 << 16
+
+class LoaderError(Exception):
+    pass
+
+def _builtin_types():
+    types = {'bool': obj.Bool, 'string': obj.String()}
+
+    for value in vars(obj.ty).values():
+        if isinstance(value, obj.BuiltinType):
+            types.setdefault(value.cpp_name, value)
+
+    return types
+
+_BUILTIN_TYPES = _builtin_types()
+
+_POINTER_NULLS = {
+    'option': obj.Pointer.Null.option,
+    'panic': obj.Pointer.Null.panic,
+    'none': None,
+}
+
+_CONSTRUCTOR_NULLS = {
+    'nothrow': obj.Constructor.Null.nothrow,
+    'catch': obj.Constructor.Null.catch,
+}
+
+def split_path(name):
+    if not isinstance(name, str) or name == '':
+        raise LoaderError('Invalid item name: %r' % (name,))
+    return name.split('::')
+
+class Loader(object):
+    def __init__(self, root=None):
+        if root is None:
+            root = obj.Namespace()
+
+        self.root = root
+
+        # Path -> module or type, for every item declared so far
+        self.items = {(): root}
+
+    # Records
+
+    def load_record(self, record):
+        if not isinstance(record, dict):
+            raise LoaderError('Records must be objects, got %r' % (record,))
+
+        kind = record.get('kind')
+        meth = getattr(self, 'load_%s' % (kind), None) if isinstance(kind, str) else None
+        if meth is None:
+            raise LoaderError('Unknown record kind: %r' % (kind,))
+
+        meth(record)
+
+    def load_namespace(self, record):
+        ns = self.module(split_path(record.get('name')), create=True)
+        self.load_module_attrs(ns, record)
+
+    def load_class(self, record):
+        path = tuple(split_path(record.get('name')))
+
+        cls = self.items.get(path)
+        if cls is None:
+            bases = [self.lookup_class(base) for base in self.list_field(record, 'bases', str)]
+            cls = obj.Class(path[-1], *bases)
+
+            self.module(path[:-1], create=True).add_item(cls)
+            self.items[path] = cls
+        elif not isinstance(cls, obj.Class):
+            raise LoaderError('%s is not a class' % ('::'.join(path)))
+        elif 'bases' in record:
+            raise LoaderError('The bases of %s are already declared' % ('::'.join(path)))
+
+        if 'realname' in record:
+            cls.cpp_name = record['realname']
+
+        self.load_module_attrs(cls, record)
+
+        for member in self.list_field(record, 'members'):
+            self.load_member(cls, path, member)
+
+    def load_function(self, record):
+        path = split_path(record.get('name'))
+        self.load_member(self.module(path[:-1]), path[:-1], dict(record, name=path[-1]))
+
+    def load_enum(self, record):
+        path = split_path(record.get('name'))
+        self.load_member(self.module(path[:-1]), path[:-1], dict(record, name=path[-1]))
+
+    def load_module_attrs(self, mod, record):
+        mod.includes |= set(self.list_field(record, 'includes', str))
+        mod.types += [self.type(ty) for ty in self.list_field(record, 'types')]
+
+        if 'modpath' in record:
+            mod.modpath = list(self.list_field(record, 'modpath', str))
+
+    def load_member(self, mod, path, member):
+        if not isinstance(member, dict):
+            raise LoaderError('Members must be objects, got %r' % (member,))
+
+        kind = member.get('kind', 'method')
+        args = [self.arg(arg) for arg in self.list_field(member, 'args')]
+        ret_ty = self.type(member.get('ret', 'void'))
+
+        if kind == 'function':
+            item = obj.Function(ret_ty, *args)
+        elif kind == 'method':
+            item = obj.Method(ret_ty, *args, const=member.get('const', False))
+        elif kind == 'static':
+            item = obj.StaticMethod(ret_ty, *args)
+        elif kind == 'ctor':
+            item = obj.Constructor(*args, null=self.flag(_CONSTRUCTOR_NULLS, member, 'null', 'nothrow'))
+        elif kind == 'dtor':
+            item = obj.Destructor()
+        elif kind == 'enum':
+            item = obj.Enum(values=[self.enum_value(value) for value in self.list_field(member, 'values')])
+        else:
+            raise LoaderError('Unknown member kind: %r' % (kind,))
+
+        name = member.get('name', kind if kind in ('ctor', 'dtor') else None)
+        if not isinstance(name, str) or name == '':
+            raise LoaderError('Missing %s name in %s' % (kind, '::'.join(path)))
+
+        if 'call_name' in member:
+            item.call_name = member['call_name']
+        if 'modpath' in member:
+            item.modpath = list(self.list_field(member, 'modpath', str))
+
+        item.name = name
+        mod.add_item(item)
+
+        if kind == 'enum':
+            self.items[tuple(path) + (name,)] = item
+
+    # Lookups
+
+    def module(self, path, create=False):
+        path = tuple(path)
+
+        mod = self.items.get(path)
+        if mod is None and create:
+            mod = obj.Namespace(path[-1])
+            self.module(path[:-1], create=True).add_item(mod)
+            self.items[path] = mod
+
+        if not isinstance(mod, obj.Module):
+            raise LoaderError('Unknown namespace or class: %s' % ('::'.join(path)))
+        return mod
+
+    def lookup_class(self, name):
+        cls = self.items.get(tuple(split_path(name)))
+        if not isinstance(cls, obj.Class):
+            raise LoaderError('Unknown class: %s' % (name))
+        return cls
+
+    # Types
+
+    def type(self, ty):
+        if isinstance(ty, str):
+            builtin = _BUILTIN_TYPES.get(ty)
+            if builtin is not None:
+                return builtin
+
+            item = self.items.get(tuple(split_path(ty)))
+            if not isinstance(item, (obj.Class, obj.Enum)):
+                raise LoaderError('Unknown type: %s' % (ty))
+            return item
+
+        if not isinstance(ty, dict):
+            raise LoaderError('Invalid type: %r' % (ty,))
+
+        kind = ty.get('kind')
+        if kind == 'ptr':
+            return obj.Pointer(self.type(ty.get('to')), const=ty.get('const', False),
+                               owned=ty.get('owned', False),
+                               null=self.flag(_POINTER_NULLS, ty, 'null', 'option'))
+        elif kind == 'ref':
+            return obj.Ref(self.type(ty.get('to')), const=ty.get('const', False))
+        elif kind == 'option':
+            return obj.Option(self.type(ty.get('to')), ty.get('default'))
+        elif kind == 'string':
+            return obj.String(const=ty.get('const', False))
+        elif kind == 'option_string':
+            return obj.OptionString(const=ty.get('const', False))
+
+        raise LoaderError('Unknown type kind: %r' % (kind,))
+
+    def arg(self, arg):
+        if isinstance(arg, list) and len(arg) == 2 and isinstance(arg[1], str):
+            return (self.type(arg[0]), arg[1])
+        return self.type(arg)
+
+    def enum_value(self, value):
+        if isinstance(value, list) and len(value) == 2:
+            return tuple(value)
+        if isinstance(value, str):
+            return value
+        raise LoaderError('Invalid enum value: %r' % (value,))
+
+    # `record[key]`, which must be a list (of `item_type` values): strings
+    # would otherwise be iterated character by character
+    def list_field(self, record, key, item_type=None):
+        value = record.get(key, [])
+
+        if not isinstance(value, list):
+            raise LoaderError('%s: field %r must be a list, got %r' % (self.record_name(record), key, value))
+        if item_type is not None:
+            for item in value:
+                if not isinstance(item, item_type):
+                    raise LoaderError('%s: field %r must be a list of %s, got %r' % (
+                        self.record_name(record), key, item_type.__name__, item))
+
+        return value
+
+    def record_name(self, record):
+        return record.get('name') or record.get('kind')
+
+    def flag(self, values, record, key, default):
+        value = record.get(key, default)
+        if value not in values:
+            raise LoaderError('Invalid %s value: %r' % (key, value))
+        return values[value]
+
+# Record streams
+
+_WHITESPACE = re.compile(r'\s*')
+
+def iter_json_lines(f):
+    for line in f:
+        line = line.strip()
+        if len(line) > 0:
+            yield json.loads(line)
+
+# Only the record being decoded (and the rest of its chunk) is kept in memory
+def iter_json_array(f, chunk_size=JSON_CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+
+    text = ''
+    pos = 0
+    # Offset of `text` in the file
+    offset = 0
+
+    # Appends the next `size` characters to the unread text, False at the end
+    def read(size):
+        nonlocal text, pos, offset
+
+        data = f.read(size)
+        if len(data) == 0:
+            return False
+
+        offset += pos
+        text = text[pos:] + data
+        pos = 0
+        return True
+
+    # The next non-whitespace character, '' at the end
+    def peek():
+        nonlocal pos
+
+        while True:
+            pos = _WHITESPACE.match(text, pos).end()
+            if pos < len(text) or not read(chunk_size):
+                return text[pos:pos + 1]
+
+    if peek() != '[':
+        raise LoaderError('Expected an array of records')
+    pos += 1
+
+    if peek() == ']':
+        return
+
+    while True:
+        peek()
+
+        # Records spanning chunks are decoded again with more text, read
+        # in growing sizes so that large records stay linear
+        size = chunk_size
+        while True:
+            try:
+                (record, end) = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                if not read(size):
+                    raise
+            else:
+                # A number may continue in the next chunk
+                if end < len(text) or not read(size):
+                    break
+            size *= 2
+
+        pos = end
+        yield record
+
+        c = peek()
+        if c == ']':
+            break
+        if c != ',':
+            raise LoaderError('Expected "," or "]" at offset %d' % (offset + pos))
+        pos += 1
+
+def iter_toml(f):
+    import tomllib
+
+    yield from tomllib.load(f).get('item', [])
+
+def iter_records(path):
+    ext = os.path.splitext(path)[1]
+
+    if ext in ('.jsonl', '.ndjson'):
+        with open(path) as f:
+            yield from iter_json_lines(f)
+    elif ext == '.json':
+        with open(path) as f:
+            yield from iter_json_array(f)
+    elif ext == '.toml':
+        with open(path, 'rb') as f:
+            yield from iter_toml(f)
+    else:
+        raise LoaderError('Unknown description format: %s' % (path))
+
+def is_description(path):
+    return os.path.splitext(path)[1] in FORMATS and os.path.isfile(path)
+
+def load(path, root=None):
+    loader = Loader(root)
+
+    # Records loaded so far, decoding errors are raised by the record after those
+    count = 0
+    try:
+        for record in iter_records(path):
+            loader.load_record(record)
+            count += 1
+    except (LoaderError, ValueError) as e:
+        raise LoaderError('%s: record %d: %s' % (path, count + 1, e)) from e
+
+    return loader.root
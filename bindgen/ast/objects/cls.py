@@ -3,6 +3,8 @@ from .ty import _Type
 from bindgen.gen import utils as gen_utils
 
 class Class(Module, _Type):
+    __slots__ = ('cpp_name', 'bases', 'upclasses', 'downclasses')
+
     def __init__(self, name, *bases):
         Module.__init__(self)
         _Type.__init__(self)
@@ -80,12 +82,11 @@ class Class(Module, _Type):
             super().write_def(lang, writer)
 
     def flat_name(self):
-        return gen_utils.c_name(self.path)
+        return self.qualified_c_name
 
     def ffi_name(self, lang, **kwargs):
         if lang == 'c':
-            path = self.path
-            path[-1] = self.cpp_name
+            path = self.frozen_path[:-1] + (self.cpp_name,)
             return gen_utils.cpp_name(path)
         elif lang == 'rust':
             path = kwargs.get('path', []) + [self.flat_name()]
@@ -98,7 +99,7 @@ class Class(Module, _Type):
             from bindgen.gen.rust import RustLibConstants
 
             tree = kwargs['tree']
-            item = tree.root.find(lambda item: item.item == self)
+            item = tree.find_item(self)
             path = [''] + item.fullpath
             name = '::'.join(path)
 
@@ -112,3 +113,100 @@ class Class(Module, _Type):
             return name
 
         return super().lib_name(lang, **kwargs)
+
+class ClassHierarchy(object):
+    def __init__(self, root):
+        self.classes = [item for item in root.traverse() if isinstance(item, Class)]
+        # Read once traversed, traversing materializes lazy bodies
+        self.revision = Module.revision
+
+        self._constructors = {}
+        self._own_destructors = {}
+        self._destructors = {}
+        self._upclasses = {}
+        self._bases = {}
+        self._downclasses = {}
+
+        for cls in self.classes:
+            self._index_class(cls)
+
+        for cls in self.classes:
+            self._downclasses.setdefault(cls, [])
+            for up in self.upclasses(cls):
+                self._downclasses.setdefault(up, []).append(cls)
+
+    def _index_class(self, cls):
+        from .func import Constructor, Destructor
+
+        if cls in self._constructors:
+            return
+
+        constructor = destructor = None
+        for item in cls.items:
+            if constructor is None and isinstance(item, Constructor):
+                constructor = item
+            elif destructor is None and isinstance(item, Destructor):
+                destructor = item
+
+        self._constructors[cls] = constructor
+        self._own_destructors[cls] = destructor
+
+    def _dedup(self, classes):
+        seen = set()
+        result = []
+
+        for cls in classes:
+            if cls not in seen:
+                seen.add(cls)
+                result.append(cls)
+
+        return tuple(result)
+
+    def constructor(self, cls):
+        self._index_class(cls)
+        return self._constructors[cls]
+
+    def destructor(self, cls):
+        if cls not in self._destructors:
+            self._index_class(cls)
+
+            destructor = self._own_destructors[cls]
+            for base in cls.bases:
+                if destructor is not None:
+                    break
+                destructor = self.destructor(base)
+
+            self._destructors[cls] = destructor
+
+        return self._destructors[cls]
+
+    # Transitive base classes, nearest first
+    def upclasses(self, cls):
+        if cls not in self._upclasses:
+            upclasses = []
+            for up in cls.upclasses:
+                upclasses.append(up)
+                upclasses += self.upclasses(up)
+
+            self._upclasses[cls] = self._dedup(upclasses)
+
+        return self._upclasses[cls]
+
+    # Transitive base classes, each one after its own bases
+    def bases(self, cls):
+        if cls not in self._bases:
+            bases = []
+            for base in cls.bases:
+                bases += self.bases(base)
+                bases.append(base)
+
+            self._bases[cls] = self._dedup(bases)
+
+        return self._bases[cls]
+
+    # Transitive derived classes found under the root
+    def downclasses(self, cls):
+        return tuple(self._downclasses.get(cls, ()))
+
+    def casts(self, cls):
+        return self.downclasses(cls) + self.upclasses(cls)
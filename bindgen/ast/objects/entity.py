@@ -1,8 +1,60 @@
+from bindgen.gen import utils as gen_utils
 
 class Entity(object):
+    # `modpath` is optional: left unset, it is resolved from the parent.
+    # Interned types refer to entities weakly (see ty._weak_key).
+    #
+    # Names derived from the parents (path, qualified names...) are not kept
+    # per entity, they are computed on demand, or read from the columns of
+    # the sealed tree (see ir.SealedTree) when generating.
+    __slots__ = ('parent', '_name', 'modpath', '__weakref__')
+
     def __init__(self):
         self.parent = None
-        self.name = None
+        self._name = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        old_name = self._name
+        self._name = name
+
+        if old_name != name and self.parent is not None:
+            self.parent.rename_item(self, old_name)
+
+    # Caches are not pickled, they are rebuilt on demand after loading
+    _transient = ()
+
+    def __getstate__(self):
+        state = {}
+
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name in ('__dict__', '__weakref__') or name in self._transient:
+                    continue
+
+                try:
+                    state[name] = cls.__dict__[name].__get__(self)
+                except AttributeError:
+                    # Unset optional slot
+                    pass
+
+        # Subclasses without __slots__ (or Module body attributes)
+        state.update(getattr(self, '__dict__', None) or {})
+
+        return state
+
+    def __setstate__(self, state):
+        for (name, value) in state.items():
+            object.__setattr__(self, name, value)
+
+        self.reset_caches()
+
+    def reset_caches(self):
+        pass
 
     def with_name(self, name):
         self.name = name
@@ -16,19 +68,30 @@ class Entity(object):
         from .ns import Namespace
 
         current = self.parent
-
         while not isinstance(current, Namespace):
             current = current.parent
 
         return current
 
     @property
-    def path(self):
-        path = []
+    def frozen_path(self):
+        path = ()
 
         if self.parent is not None:
-            path += self.parent.path
+            path = self.parent.frozen_path
         if self.name is not None:
-            path.append(self.name)
+            path += (self.name,)
 
         return path
+
+    @property
+    def path(self):
+        return list(self.frozen_path)
+
+    @property
+    def qualified_c_name(self):
+        return gen_utils.c_name(self.frozen_path)
+
+    @property
+    def qualified_cpp_name(self):
+        return gen_utils.cpp_name(self.frozen_path)
@@ -2,9 +2,10 @@ from .cls import Class
 from .entity import Entity
 from .ty import _Type
 from ..utils import get_modpath
-from bindgen.gen import utils as gen_utils
 
 class Enum(Entity, _Type):
+    __slots__ = ('values',)
+
     def __init__(self, name=None, values=[]):
         Entity.__init__(self)
         _Type.__init__(self)
@@ -30,11 +31,11 @@ class Enum(Entity, _Type):
             super().write_def(lang, writer)
 
     def flat_name(self):
-        return gen_utils.c_name(self.path)
+        return self.qualified_c_name
 
     def ffi_name(self, lang, **kwargs):
         if lang == 'c':
-            return gen_utils.cpp_name(self.path)
+            return self.qualified_cpp_name
         elif lang == 'rust':
             path = kwargs.get('path', []) + [self.flat_name()]
             return '::'.join(path)
@@ -43,7 +44,13 @@ class Enum(Entity, _Type):
 
     def lib_name(self, lang, **kwargs):
         if lang == 'rust':
-            path = [''] + get_modpath(self) + [self.name]
+            tree = kwargs.get('tree')
+            if tree is not None and tree.root.ir is not None:
+                modpath = list(tree.root.ir.modpath(self))
+            else:
+                modpath = get_modpath(self)
+
+            path = [''] + modpath + [self.name]
             return '::'.join(path)
 
         return super().lib_name(lang, **kwargs)
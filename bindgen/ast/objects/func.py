@@ -10,6 +10,8 @@ def raw(cls):
     return func
 
 class RawFunction(Entity):
+    __slots__ = ()
+
     def generate(self, builder, lang, **kwargs):
         meth_name = self.gen_meth_name(lang, **kwargs)
         meth = getattr(self, meth_name, None)
@@ -24,6 +26,8 @@ class RawFunction(Entity):
         return name
 
 class Function(Entity):
+    __slots__ = ('ret_ty', 'arg_tys', '_call_name')
+
     def __init__(self, ret_ty=Void, *arg_tys):
         super().__init__()
         self.ret_ty = ret_ty
@@ -59,6 +63,8 @@ class Function(Entity):
 fn = Function
 
 class RawMethod(RawFunction):
+    __slots__ = ()
+
     def gen_meth_name(self, lang, **kwargs):
         name = super().gen_meth_name(lang, **kwargs)
 
@@ -68,6 +74,8 @@ class RawMethod(RawFunction):
         return name
 
 class Method(Function):
+    __slots__ = ('_arg_tys', 'const')
+
     def __init__(self, ret_ty=Void, *arg_tys, const=False):
         Entity.__init__(self)
         self.ret_ty = ret_ty
@@ -90,9 +98,11 @@ class Method(Function):
 meth = Method
 
 class StaticMethod(Function):
-    pass
+    __slots__ = ()
 
 class Constructor(StaticMethod):
+    __slots__ = ('null',)
+
     class Null(enum.Enum):
         nothrow = 1
         catch = 2
@@ -111,6 +121,6 @@ class Constructor(StaticMethod):
 ctor = Constructor
 
 class Destructor(Method):
-    pass
+    __slots__ = ()
 
 dtor = Destructor
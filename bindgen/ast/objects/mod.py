@@ -1,27 +1,166 @@
 from .entity import Entity
+from functools import partial
 
 def isinstance_filter(cls):
     def _filter(item):
         return isinstance(item, cls)
     return _filter
 
+# Classes and enums a type refers to
+def _type_deps(ty):
+    from .ty import InternedType, _Type
+
+    if isinstance(ty, Entity):
+        return [ty]
+    elif isinstance(ty, InternedType):
+        return [dep for arg in ty._args() if isinstance(arg, _Type) for dep in _type_deps(arg)]
+    return []
+
+# Classes and enums an item refers to, outside of its own items
+def _item_deps(item):
+    from .cls import Class
+    from .func import Function
+
+    deps = []
+    if isinstance(item, Class):
+        deps += item.bases
+    if isinstance(item, Module):
+        for ty in item.types:
+            deps += _type_deps(ty)
+    if isinstance(item, Function):
+        deps += _type_deps(item.ret_ty)
+        for (ty, _) in item.arg_tys:
+            deps += _type_deps(ty)
+    return deps
+
 class Module(Entity):
+    # Body attributes (`_foo_ = ...`) may set arbitrary members, keep a __dict__ for those
+    __slots__ = (
+        '_items', '_index', '_ordered_items', '_includes', '_types', '_lazy_bodies',
+        '_hierarchy', '_traversal', '_sealed', '__dict__',
+    )
+
+    _factories = {}
+    _transient = Entity._transient + ('_ordered_items', '_hierarchy', '_traversal', '_sealed')
+
+    # Bumped on every structural change, used to invalidate derived indexes
+    revision = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # Only direct subclasses are exposed as item factories (`ns.Class(...)`)
+        if Module in cls.__bases__:
+            Module._factories.setdefault(cls.__name__, cls)
+
+    # Forgets the item factories defined by descriptions rather than by
+    # bindgen, e.g. before loading them again
+    @staticmethod
+    def reset_factories():
+        for (name, cls) in list(Module._factories.items()):
+            if cls.__module__.split('.')[0] != 'bindgen':
+                del Module._factories[name]
+
     def __init__(self):
         super().__init__()
 
-        self.items = []
-        self.includes = set()
-        self.types = []
+        # Everything but the items is created on first use, most modules
+        # (classes, enums) have no includes, types or lazy bodies
+        self._items = []
+        self._index = None
+        self._includes = None
+        self._types = None
+        self._lazy_bodies = None
+
+        self._ordered_items = None
+        self._hierarchy = None
+        self._traversal = None
+        self._sealed = None
 
     def extra(self, lang, writer):
         pass
 
+    # Everything below reads the module contents, which runs the pending lazy bodies first
+    @property
+    def items(self):
+        self.materialize()
+        return self._items
+
+    @property
+    def includes(self):
+        self.materialize()
+        if self._includes is None:
+            self._includes = set()
+        return self._includes
+
+    @includes.setter
+    def includes(self, includes):
+        self.materialize()
+        self._includes = includes
+
+    @property
+    def types(self):
+        self.materialize()
+        if self._types is None:
+            self._types = []
+        return self._types
+
+    @types.setter
+    def types(self, types):
+        self.materialize()
+        self._types = types
+
+    @property
+    def materialized(self):
+        return not self._lazy_bodies
+
+    def materialize(self):
+        # Bodies may look items up in this module, so each one is popped before it runs
+        while self._lazy_bodies:
+            body = self._lazy_bodies.pop(0)(self)
+            if body is not None:
+                self.body(body)
+
     def items_filter(self, cls):
         return filter(isinstance_filter(cls), self.items)
 
     def add_item(self, item):
         item.parent = self
-        self.items.append(item)
+        self._items.append(item)
+        self._index_item(item, item.name)
+
+        self._ordered_items = None
+        Module.revision += 1
+
+    def reset_caches(self):
+        super().reset_caches()
+
+        self._ordered_items = None
+        self._hierarchy = None
+        self._traversal = None
+        self._sealed = None
+
+    def rename_item(self, item, old_name):
+        self._unindex_item(item, old_name)
+        self._index_item(item, item.name)
+
+        self._ordered_items = None
+        Module.revision += 1
+
+    def _index_item(self, item, name):
+        if name is not None:
+            if self._index is None:
+                self._index = {}
+            self._index.setdefault(name, []).append(item)
+
+    def _unindex_item(self, item, name):
+        items = self._index and self._index.get(name)
+        if not items:
+            return
+
+        items[:] = [it for it in items if it is not item]
+        if len(items) == 0:
+            del self._index[name]
 
     def new_item(self, cls, *args, **kwargs):
         item = cls(*args, **kwargs)
@@ -30,15 +169,27 @@ class Module(Entity):
 
     def body(self, body):
         for (k, v) in body.__dict__.items():
+            # Class machinery (__module__, __dict__, ...), not body items
+            if k.startswith('__') and k.endswith('__'):
+                continue
+
             self.add_body_item(k, v)
 
         return self
 
+    # Deferred body: `func(module)` runs when the module contents are first
+    # needed, and either returns a body class or adds the items itself.
+    def lazy_body(self, func):
+        if self._lazy_bodies is None:
+            self._lazy_bodies = []
+        self._lazy_bodies.append(func)
+        return self
+
     def add_body_item(self, name, item):
         if name == '_includes_' and isinstance(item, (set, list, tuple)):
-            self.includes |= set(item)
+            self._includes = (self._includes or set()) | set(item)
         elif name == '_types_' and isinstance(item, (list)):
-            self.types += item
+            self._types = (self._types or []) + item
         elif name.startswith('_'):
             attr_name = name[1:-1]
             setattr(self, attr_name, item)
@@ -50,17 +201,34 @@ class Module(Entity):
     def traverse(self):
         yield from super().traverse()
 
-        for item in sorted(self.items, key=lambda item: item.name):
+        for item in self.ordered_items:
             yield from item.traverse()
 
+    # Children sorted by name, kept until the next insertion or rename
+    @property
+    def ordered_items(self):
+        if self._ordered_items is None:
+            self._ordered_items = tuple(sorted(self.items, key=lambda item: item.name))
+        return self._ordered_items
+
+    # Pre-order traversal snapshot, shared until the tree changes
+    @property
+    def traversal(self):
+        if self._traversal is None or self._traversal[0] != Module.revision:
+            # Traversing materializes lazy bodies, the revision is read after
+            entities = tuple(self.traverse())
+            self._traversal = (Module.revision, entities)
+        return self._traversal[1]
+
     def __getattr__(self, name):
-        # Find subclasses
-        for cls in Module.__subclasses__():
-            def _wrapper(*args, **kwargs):
-                return self.new_item(cls, *args, **kwargs)
+        # Private attributes are never items, and must not recurse into the index
+        if name.startswith('_'):
+            raise AttributeError(name)
 
-            if cls.__name__ == name:
-                return _wrapper
+        # Find subclasses
+        cls = Module._factories.get(name)
+        if cls is not None:
+            return partial(self.new_item, cls)
 
         try:
             return self[name]
@@ -68,34 +236,188 @@ class Module(Entity):
             raise AttributeError(name)
 
     def __getitem__(self, name):
+        self.materialize()
+
         # Find item
-        for item in self.items:
-            if getattr(item, 'name') == name:
-                return item
+        items = self._index and self._index.get(name)
+        if items:
+            return items[0]
 
         raise KeyError(name)
 
     def __setitem__(self, name, value):
-        indexes_to_delete = []
-        for (i, item) in enumerate(self.items):
-            if getattr(item, 'name') == name:
-                indexes_to_delete.append(i)
+        self.materialize()
 
-        for idx in reversed(indexes_to_delete):
-            del self.items[idx]
+        items = self._index and self._index.pop(name, None)
+        if items:
+            removed = set(map(id, items))
+            self._items = [item for item in self._items if id(item) not in removed]
+            self._ordered_items = None
+            Module.revision += 1
 
         self.add_body_item(name, value)
 
     def __iter__(self):
         return iter(self.items)
 
+    # Snapshots hold the whole tree, pending bodies cannot be pickled
+    def __getstate__(self):
+        self.materialize()
+        return super().__getstate__()
+
+    # Copy of this module restricted to the namespaces in `paths` (lists of
+    # names, relative to this module) and their sub-namespaces. The modules
+    # leading to them are kept as empty shells, and the namespaces holding the
+    # classes and enums the kept items depend on (bases, argument and return
+    # types...) are kept too, so that every reference resolves in the copy.
+    # This module is left untouched.
+    def restricted(self, paths):
+        import copy
+        from .cls import Class
+        from .ns import Namespace
+
+        paths = [list(path) for path in paths]
+        if any(len(path) == 0 for path in paths):
+            return self
+
+        # Modules whose own items are kept, by id
+        units = {}
+        pending = []
+
+        def keep(unit):
+            if id(unit) not in units:
+                units[id(unit)] = unit
+                pending.append(unit)
+
+        for path in paths:
+            try:
+                ns = self
+                for name in path:
+                    ns = ns[name]
+            except (KeyError, TypeError):
+                ns = None
+
+            if not isinstance(ns, Namespace):
+                raise Exception('%s is not a namespace' % ('::'.join(path)))
+
+            keep(ns)
+            for item in ns.deep():
+                if isinstance(item, Namespace):
+                    keep(item)
+
+        # Follows the dependencies of the kept items to their own modules
+        kept = {}
+        while len(pending) > 0:
+            unit = pending.pop()
+
+            deps = []
+            for ty in unit.types:
+                deps += _type_deps(ty)
+
+            for item in unit.items:
+                if isinstance(item, Namespace):
+                    continue
+
+                subitems = [item]
+                if isinstance(item, Module):
+                    subitems += item.deep()
+
+                for sub in subitems:
+                    kept[id(sub)] = sub
+                    deps += _item_deps(sub)
+
+            for dep in deps:
+                dep_unit = self._dep_unit(dep)
+                if dep_unit is None:
+                    raise Exception('%s depends on %s, which is outside of the restricted module' % (
+                        unit.qualified_cpp_name, dep.qualified_cpp_name))
+                keep(dep_unit)
+
+        # The modules leading to the kept ones, from this one down
+        shells = {id(self): self}
+        for unit in units.values():
+            chain = []
+            while id(unit) not in shells:
+                chain.append(unit)
+                unit = unit.parent
+            for module in reversed(chain):
+                shells[id(module)] = module
+
+        # Entities outside of the kept ones are not copied, the references to
+        # them are dropped (the subclasses in other namespaces) or shared
+        memo = {id(self.parent): self.parent}
+        downclasses = []
+        for item in kept.values():
+            if isinstance(item, Class):
+                memo[id(item.downclasses)] = down = []
+                downclasses.append((item, down))
+
+        copies = {}
+        for (key, module) in shells.items():
+            state = module.__getstate__()
+            state.update(_items=[], _index=None)
+            if key not in units:
+                state.update(_types=None)
+
+            shell = object.__new__(type(module))
+            memo[key] = shell
+            copies[key] = (module, shell, state)
+
+        for (module, shell, state) in copies.values():
+            shell.__setstate__(copy.deepcopy(state, memo))
+
+        for (key, (module, shell, state)) in copies.items():
+            for item in module.items:
+                if id(item) in shells:
+                    shell.add_item(memo[id(item)])
+                elif key in units and not isinstance(item, Namespace):
+                    shell.add_item(copy.deepcopy(item, memo))
+
+        for (cls, down) in downclasses:
+            down += [memo[id(sub)] for sub in cls.downclasses if id(sub) in kept]
+
+        return memo[id(self)]
+
+    # The module whose own items hold `dep`, None if `dep` is not in this one
+    def _dep_unit(self, dep):
+        from .ns import Namespace
+
+        module = dep.parent
+        while module is not None:
+            if module is self or isinstance(module, Namespace):
+                break
+            module = module.parent
+
+        # Only inside of this module
+        parent = module
+        while parent is not None and parent is not self:
+            parent = parent.parent
+
+        return module if parent is self else None
+
     def deep(self):
-        for item in sorted(self.items, key=lambda item: item.name):
+        for item in self.ordered_items:
             yield item
 
             if isinstance(item, Module):
                 yield from item.deep()
 
+    # Lower this tree to the immutable IR read by the generators
+    def seal(self):
+        from ..ir import SealedTree
+
+        if self._sealed is None or self._sealed.revision != Module.revision:
+            self._sealed = SealedTree(self)
+        return self._sealed
+
+    @property
+    def hierarchy(self):
+        from .cls import ClassHierarchy
+
+        if self._hierarchy is None or self._hierarchy.revision != Module.revision:
+            self._hierarchy = ClassHierarchy(self)
+        return self._hierarchy
+
     @property
     def namespaces(self):
         from .ns import Namespace
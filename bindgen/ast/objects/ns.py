@@ -1,6 +1,8 @@
 from .mod import Module
 
 class Namespace(Module):
+    __slots__ = ()
+
     def __init__(self, name=''):
         super().__init__()
 
@@ -1,10 +1,18 @@
 import enum
+import weakref
 from bindgen.gen import utils as gen_utils
 
 class _Type(object):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
+    # The type whose definition `write_def` actually emits
+    @property
+    def def_type(self):
+        return self
+
     def write_def(self, lang, writer):
         pass
 
@@ -20,14 +28,110 @@ class _Type(object):
     def transform(self, lang, expr, out=False):
         return expr
 
+class _InternedMeta(type):
+    def __init__(cls, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Call arguments -> instance, per class. Like _interned, it does not
+        # keep the instances (and the classes they refer to) alive.
+        cls._calls = weakref.WeakValueDictionary()
+        _interned_classes.add(cls)
+
+    def __call__(cls, *args, **kwargs):
+        try:
+            call_key = _weak_key((args, tuple(sorted(kwargs.items()))))
+            instance = cls._calls.get(call_key)
+        except TypeError:
+            # Unhashable arguments, only intern on the structural key
+            call_key = None
+            instance = None
+
+        if instance is None:
+            instance = super().__call__(*args, **kwargs)
+            try:
+                instance = _interned.setdefault(_weak_key(instance._key), instance)
+            except TypeError:
+                # Unhashable structural key (e.g. a list default), not interned
+                pass
+            object.__setattr__(instance, '_frozen', True)
+
+            if call_key is not None:
+                cls._calls[call_key] = instance
+
+        return instance
+
+# Structural key -> instance, for every interned type still in use
+_interned = weakref.WeakValueDictionary()
+_interned_classes = weakref.WeakSet()
+
+# Forgets every interned type, e.g. before loading a description again.
+# Types interned afterwards are equal to the previous ones, not identical.
+def clear_interned():
+    _interned.clear()
+    for cls in _interned_classes:
+        cls._calls.clear()
+
+# Types in the keys (classes, enums and the interned types built on them) are
+# only weakly referenced, otherwise an entry would keep alive the tree whose
+# types it interns.
+def _weak_key(key):
+    if isinstance(key, tuple):
+        return tuple(_weak_key(item) for item in key)
+    elif isinstance(key, _Type):
+        return weakref.ref(key)
+    return key
+
+class InternedType(_Type, metaclass=_InternedMeta):
+    __slots__ = ('_frozen', '_hash', '__weakref__')
+
+    # Arguments which rebuild an equal instance through the constructor
+    def _args(self):
+        raise NotImplementedError('InternedType._args')
+
+    @property
+    def _key(self):
+        return (type(self),) + self._args()
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('%s instances are immutable' % (type(self).__name__))
+        super().__setattr__(name, value)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, InternedType):
+            return NotImplemented
+        return self._key == other._key
+
+    # Types are used as cache keys all over, and never change once interned
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            h = hash(self._key)
+            if getattr(self, '_frozen', False):
+                object.__setattr__(self, '_hash', h)
+            return h
+
+    def __reduce__(self):
+        return (type(self), self._args())
+
 class ConvertibleType(_Type):
+    __slots__ = ()
+
     def convert_to_ffi(self, writer, lang, expr, **kwargs):
         raise NotImplementedError('ConvertibleType.convert_to_ffi')
 
     def convert_from_ffi(self, writer, lang, expr, **kwargs):
         raise NotImplementedError('ConvertibleType.convert_from_ffi')
 
-class BoolType(_Type):
+class BoolType(InternedType):
+    __slots__ = ()
+
+    def _args(self):
+        return ()
+
     def flat_name(self):
         return 'bool'
 
@@ -61,7 +165,9 @@ class BoolType(_Type):
 
 Bool = BoolType()
 
-class Option(_Type):
+class Option(InternedType):
+    __slots__ = ('subtype', 'default')
+
     # A None default means only something when subtype is a class.
     def __init__(self, subtype, default=None):
         super().__init__()
@@ -69,6 +175,13 @@ class Option(_Type):
         self.subtype = subtype
         self.default = default
 
+    def _args(self):
+        return (self.subtype, self.default)
+
+    @property
+    def def_type(self):
+        return self.subtype.def_type
+
     def write_def(self, lang, writer):
         self.subtype.write_def(lang, writer)
 
@@ -84,7 +197,9 @@ class Option(_Type):
     def transform(self, lang, expr, out=False):
         return self.subtype.transform(lang, expr, out=out)
 
-class BuiltinType(_Type):
+class BuiltinType(InternedType):
+    __slots__ = ('cpp_name', 'rust_name', 'rust_lib_name')
+
     def __init__(self, cpp_name, rust_name, rust_lib_name=None):
         super().__init__()
 
@@ -92,6 +207,9 @@ class BuiltinType(_Type):
         self.rust_name = rust_name
         self.rust_lib_name = rust_lib_name
 
+    def _args(self):
+        return (self.cpp_name, self.rust_name, self.rust_lib_name)
+
     def flat_name(self):
         return self.rust_name.replace('::', '_')
 
@@ -141,12 +259,17 @@ UnsignedInt64 = BuiltinType('uint64_t', _rust_tyname('uint64_t'), 'u64')
 Double = BuiltinType('double', _rust_tyname('c_double'), 'f64')
 Float = BuiltinType('float', _rust_tyname('c_float'), 'f32')
 
-class String(ConvertibleType):
+class String(ConvertibleType, InternedType):
+    __slots__ = ('const',)
+
     def __init__(self, const=False):
         super().__init__()
 
         self.const = const
 
+    def _args(self):
+        return (self.const,)
+
     def write_def(self, lang, writer):
         if lang == 'rust':
             writer.attr('repr', ['C'])
@@ -208,16 +331,26 @@ class String(ConvertibleType):
         return super().convert_to_ffi(writer, lang, expr, **kwargs)
 
 class OptionString(Option):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(String(*args, **kwargs), '""')
 
-class Ref(_Type):
+    def _args(self):
+        return (self.subtype.const,)
+
+class Ref(InternedType):
+    __slots__ = ('subtype', 'const')
+
     def __init__(self, subtype, const=False):
         super().__init__()
 
         self.subtype = subtype
         self.const = const
 
+    def _args(self):
+        return (self.subtype, self.const)
+
     def flat_name(self):
         name = '%s_ref' % (self.subtype.flat_name())
 
@@ -259,7 +392,9 @@ class Ref(_Type):
 
 ref = Ref
 
-class Pointer(_Type):
+class Pointer(InternedType):
+    __slots__ = ('subtype', 'const', 'owned', 'null')
+
     class Null(enum.Enum):
         option = 1
         panic = 2
@@ -272,6 +407,9 @@ class Pointer(_Type):
         self.owned = owned
         self.null = null
 
+    def _args(self):
+        return (self.subtype, self.const, self.owned, self.null)
+
     def flat_name(self):
         name = '%s_ptr' % (self.subtype.flat_name())
 
@@ -1,3 +1,4 @@
+from functools import partial
 
 # Module path utils
 def get_parent_modpath(item):
@@ -12,25 +13,84 @@ def resolve_modpath(modpath, item):
         modpath = modpath(item)
     return modpath
 
-def get_modpath(item):
+def _get_modpath(item):
     if hasattr(item, 'modpath'):
         return resolve_modpath(item.modpath, item)
     return get_parent_modpath(item)
 
+# Memoizes modpaths while active, every get_modpath() call (including the
+# ones made by modpath functions) goes through the innermost resolver.
+# Dependencies are resolved before their dependents, and a modpath which
+# depends on itself is reported instead of recursing forever.
+class ModpathResolver(object):
+    def __init__(self):
+        self.modpaths = {}
+        self._resolving = []
+        self._pending = set()
+
+    def __enter__(self):
+        _resolvers.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _resolvers.remove(self)
+
+    def resolve(self, item):
+        modpath = self.modpaths.get(item)
+
+        if modpath is None:
+            if item in self._pending:
+                cycle = self._resolving[self._resolving.index(item):] + [item]
+                names = ['::'.join(it.path) for it in cycle]
+                raise Exception('Modpath cycle detected: %s' % (' -> '.join(names)))
+
+            self._resolving.append(item)
+            self._pending.add(item)
+            try:
+                modpath = tuple(_get_modpath(item))
+            finally:
+                self._resolving.pop()
+                self._pending.discard(item)
+
+            self.modpaths[item] = modpath
+
+        return list(modpath)
+
+_resolvers = []
+
+def get_modpath(item):
+    if len(_resolvers) > 0:
+        return _resolvers[-1].resolve(item)
+
+    with ModpathResolver() as resolver:
+        return resolver.resolve(item)
+
+def resolve_modpaths(items):
+    with ModpathResolver() as resolver:
+        for item in items:
+            resolver.resolve(item)
+
+        return resolver.modpaths
+
+# Modpath functions are partials of module-level functions (rather than
+# closures) so that trees using them can be pickled.
+def _submodpath(path, item):
+    return get_parent_modpath(item) + path
+
 def submodpath(path):
-    def _modpath(item):
-        return get_parent_modpath(item) + path
-    return _modpath
+    return partial(_submodpath, path)
+
+def _concatmodpaths(paths, item):
+    modpath = []
+    for path in iter(paths):
+        modpath += resolve_modpath(path, item)
+    return modpath
 
 def concatmodpaths(*paths):
-    def _modpath(item):
-        modpath = []
-        for path in iter(paths):
-            modpath += resolve_modpath(path, item)
-        return modpath
-    return _modpath
+    return partial(_concatmodpaths, paths)
+
+def _copymodpath(item, it):
+    return get_modpath(item)
 
 def copymodpath(item):
-    def _modpath(it):
-        return get_modpath(item)
-    return _modpath
+    return partial(_copymodpath, item)
@@ -1,38 +1,129 @@
 from . import utils as gen_utils
+from bindgen import profile
 from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+import re
 
 class CodeGenerator(object):
     def __init__(self, root):
         self.root = root
 
+    @property
+    def ir(self):
+        return self.root.seal()
+
+# Characters str.splitlines() breaks lines on
+_LINE_BREAKS = re.compile('[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+# What CodeWriter.file returns: writes to it are buffered with the others,
+# so that they keep their order
+class _BufferedFile(object):
+    def __init__(self, writer):
+        self._writer = writer
+
+    def write(self, data):
+        self._writer.raw_write(data)
+
+    def flush(self):
+        self._writer.flush()
+
+# Writes are buffered, and only reach the file in blocks, on flush(), or when
+# the writer is closed. Use it as a context manager (or call close()) so that
+# nothing is left in the buffer.
 class CodeWriter(object):
+    # Pending chunks are written to the file in blocks of this many
+    FLUSH_CHUNKS = 4096
+
     def __init__(self, gen, file):
         self.gen = gen
-        self.file = file
+        self._file = file
+
+        self._chunks = []
+
+        # Characters flushed, and in the first `_counted` pending chunks
+        self._flushed = 0
+        self._counted = 0
+        self._counted_size = 0
 
         self._indent = 0
         self._indent_text = ' ' * 4
+        self._prefix = ''
 
         self._newline = True
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The output is discarded on errors, no need to write the rest
+        if exc_type is None:
+            self.close()
+
+    # The output file. Writing to it directly goes through the buffer too.
+    @property
+    def file(self):
+        return _BufferedFile(self)
+
     @contextmanager
     def indent(self, amount=1):
         self._indent += amount
+        self._prefix = self._indent_text * self._indent
         yield
         self._indent -= amount
+        self._prefix = self._indent_text * self._indent
 
     def raw_write(self, data=''):
-        self.file.write(data)
+        chunks = self._chunks
+        chunks.append(data)
+
+        if len(chunks) >= self.FLUSH_CHUNKS:
+            self.flush()
+
+    # Writes the pending chunks
+    def flush(self):
+        if len(self._chunks) > 0:
+            text = ''.join(self._chunks)
+            self._file.write(text)
+            self._chunks = []
+
+            self._flushed += len(text)
+            self._counted = self._counted_size = 0
+
+    # Characters written so far, e.g. where the next fragment starts. Pending
+    # chunks are only counted once.
+    @property
+    def position(self):
+        chunks = self._chunks
+        if self._counted < len(chunks):
+            self._counted_size += sum(map(len, chunks[self._counted:]))
+            self._counted = len(chunks)
+
+        return self._flushed + self._counted_size
+
+    # Writes the pending chunks, once done writing. The file is left open,
+    # it belongs to the caller.
+    def close(self):
+        self.flush()
 
     def write(self, data=''):
+        # Single line
+        if _LINE_BREAKS.search(data) is None:
+            if len(data) > 0:
+                if self._newline:
+                    self.raw_write(self._prefix)
+                    self._newline = False
+
+                self.raw_write(data)
+            return
+
         for (i, line) in enumerate(data.splitlines()):
             if i > 0:
                 self.raw_write('\n')
                 self._newline = True
 
             if self._newline and len(line) > 0:
-                indent = self._indent_text * self._indent
-                self.raw_write(indent)
+                self.raw_write(self._prefix)
                 self._newline = False
 
             self.raw_write(line)
@@ -43,10 +134,45 @@ class CodeWriter(object):
 
         self._newline = True
 
+    # Redirects the output to a string, e.g. to cache a rendered fragment
+    @contextmanager
+    def capture(self):
+        self.flush()
+
+        (file, flushed) = (self._file, self._flushed)
+        self._file = StringIO()
+
+        # Positions in the captured text are counted from where it goes
+        try:
+            yield self._file
+        finally:
+            self.flush()
+            (self._file, self._flushed) = (file, flushed)
+
+    # Writes back a fragment rendered at the same position (see capture)
+    def write_fragment(self, text):
+        if len(text) > 0:
+            self.raw_write(text)
+            self._newline = text.endswith('\n')
+
 class CodeBuilder(object):
     def __init__(self, writer):
         self.writer = writer
 
+        # BindingGenerator driving this builder, if any
+        self.binding = None
+
+    def fragment(self, key, inputs, render, *args):
+        if self.binding is None:
+            render(*args)
+        else:
+            self.binding.fragment(self.writer, key, inputs, render, *args)
+
+    def fragment_inputs(self, i):
+        if self.binding is None:
+            return None
+        return self.binding.fragment_inputs(i)
+
     def c_name(self, path):
         return gen_utils.c_name(path)
 
@@ -54,18 +180,142 @@ class CodeBuilder(object):
         return gen_utils.cpp_name(path)
 
 class BindingGenerator(object):
+    # Whether generate() spreads its own work over `jobs` worker processes.
+    # Such generators run in the main process with -j (see main.run_parallel),
+    # since worker processes do not fork again.
+    own_pool = False
+
     def __init__(self, root):
         self.root = root
 
+        # Output files actually (re)written, and left as they were
+        self.written = 0
+        self.unchanged = 0
+
+        # Incremental generation state (see manifest.Manifest), if any
+        self.manifest = None
+
+        # Worker processes a generator may use (see bindgen.utils.fork_map)
+        self.jobs = 1
+
+        # Where the outputs go (see sink.OutputSink)
+        self.sink = DiskSink()
+
+        # Phase timings (see bindgen.profile.Profiler), if any
+        self.profiler = None
+
+        # Output file being rendered, where fragments are recorded
+        self.output_path = None
+
+    # Sealed IR of the root, shared by every generator of the same root
+    @property
+    def ir(self):
+        return self.root.seal()
+
     def generate(self, dest):
         pass
 
     def makedir(self, path):
-        if not path.exists():
-            path.mkdir(parents=True)
+        self.sink.makedir(path)
+
+    # Times a phase of the generation, when profiling
+    def phase(self, name, **attrs):
+        return profile.phase(self.profiler, name, **attrs)
+
+    # Streams an output file to the sink as it is rendered, through a bounded
+    # pipe (see pipeline.OutputPipe). The file is only replaced if its
+    # content changed, and left as it was if rendering fails.
+    @contextmanager
+    def output(self, path, inputs=None):
+        with self.phase('file', path=str(path)):
+            f = OutputPipe(self.sink.open(path))
+
+            try:
+                with self.rendering(path):
+                    yield f
+            except BaseException:
+                f.abort()
+                raise
+
+            self.record_output(path, f.close(), inputs)
+
+    # Renders the output file `path`, see fragment()
+    @contextmanager
+    def rendering(self, path):
+        (previous, self.output_path) = (self.output_path, path)
+        try:
+            yield
+        finally:
+            self.output_path = previous
 
+    def write_output(self, path, text, inputs=None):
+        with self.phase('file', path=str(path)):
+            self.record_output(path, self.sink.write(path, text), inputs)
+
+    def record_output(self, path, changed, inputs=None):
+        if changed:
+            self.written += 1
+        else:
+            self.unchanged += 1
+
+        if self.manifest is not None:
+            self.manifest.record_file(path, inputs)
+
+    # Whether `path` is already generated from `inputs` (a digest), in
+    # incremental mode. Fresh files do not need to be generated again.
+    def is_fresh(self, path, inputs):
+        if self.manifest is None or not self.manifest.is_fresh(path, inputs, self.sink.exists):
+            return False
+
+        self.unchanged += 1
+        return True
+
+    # Calls `render(*args)`, or in incremental mode reuses its output from the
+    # previous run if `inputs` (a digest, None if unknown) did not change.
+    # Only fragments of an output file (see rendering()) are recorded.
+    def fragment(self, writer, key, inputs, render, *args):
+        if self.manifest is None or inputs is None or self.output_path is None:
+            render(*args)
+            return
+
+        text = self.manifest.fragment(key, inputs)
+        if text is None:
+            with writer.capture() as f:
+                render(*args)
+            text = f.getvalue()
+
+        self.manifest.record_fragment(key, inputs, text, self.output_path, writer.position)
+        writer.write_fragment(text)
+
+    # Inputs of the code generated for an entity, None if they cannot be known
+    # (or are not needed, out of incremental mode)
+    def fragment_inputs(self, i):
+        if self.manifest is None:
+            return None
+
+        ir = self.ir
+
+        if ir.opaque[i]:
+            return None
+        return ir.fingerprints[i]
+
+from .pipeline import OutputPipe
+from .sink import DiskSink, MemorySink
 from . import c, rust, utils
 
 GENERATORS = []
 GENERATORS += c.GENERATORS
 GENERATORS += rust.GENERATORS
+
+# Runs the generators into memory, returns {relative_path: text}
+def generate_files(root, generators=None):
+    if generators is None:
+        generators = GENERATORS
+
+    sink = MemorySink()
+    for Generator in generators:
+        gen = Generator(root)
+        gen.sink = sink
+        gen.generate(Path(sink.dest))
+
+    return sink.files
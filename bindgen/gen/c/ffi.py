@@ -12,25 +12,29 @@ class CFFICodeBuilder(CodeBuilder):
     def _generate_function(self, writer, func):
         from bindgen.ast import objects as obj
 
-        writer.comment(writer.gen.cpp_name(func.path))
+        ir = writer.gen.ir
+        ret_ty = ir.ret_ty(func)
+        arg_tys = ir.arg_tys(func)
 
-        name = writer.gen.c_name(func.path)
-        ret_tyname = func.ret_ty.ffi_name('c')
+        writer.comment(ir.cpp_name(func))
+
+        name = ir.c_name(func)
+        ret_tyname = ir.ffi_name(ret_ty, 'c')
 
         args = []
-        for (arg_ty, arg_name) in func.arg_tys:
+        for (arg_ty, arg_name) in arg_tys:
             if isinstance(arg_ty, obj.Option):
                 arg_ty = arg_ty.subtype
 
             if isinstance(arg_ty, obj.ConvertibleType):
                 arg_name = '_' + arg_name
 
-            arg_ty = arg_ty.ffi_name('c')
+            arg_ty = ir.ffi_name(arg_ty, 'c')
             args.append((arg_ty, arg_name))
 
         with writer.function(name, ret_tyname, args):
             # Prepare arguments
-            for (arg_ty, arg_name) in func.arg_tys:
+            for (arg_ty, arg_name) in arg_tys:
                 if isinstance(arg_ty, obj.Option):
                     arg_ty = arg_ty.subtype
 
@@ -39,7 +43,7 @@ class CFFICodeBuilder(CodeBuilder):
                     writer.declare_var('auto', arg_name, value)
 
             # Call function
-            call_args = [arg_ty.transform('c', arg_name) for (arg_ty, arg_name) in func.arg_tys]
+            call_args = [arg_ty.transform('c', arg_name) for (arg_ty, arg_name) in arg_tys]
 
             if isinstance(func, obj.Constructor):
                 ret = self.generate_constructor(func, call_args)
@@ -54,16 +58,16 @@ class CFFICodeBuilder(CodeBuilder):
                 call_name = '%s->%s' % (this_arg, func.call_name)
                 ret = writer.gen.call(call_name, call_args)
             else:
-                path = func.path[:-1] + [func.call_name]
+                path = ir.path(func)[:-1] + (func.call_name,)
                 call_name = writer.gen.cpp_name(path)
                 ret = writer.gen.call(call_name, call_args)
 
-            if isinstance(func.ret_ty, obj.ConvertibleType):
+            if isinstance(ret_ty, obj.ConvertibleType):
                 writer.declare_var('auto', 'ret', ret)
-                ret = func.ret_ty.convert_to_ffi(writer, 'c', 'ret')
+                ret = ret_ty.convert_to_ffi(writer, 'c', 'ret')
 
-            ret = func.ret_ty.transform('c', ret, out=True)
-            if func.ret_ty != obj.Void:
+            ret = ret_ty.transform('c', ret, out=True)
+            if ret_ty != obj.Void:
                 writer.ret(ret)
             else:
                 writer.writeln('%s;' % (ret))
@@ -72,8 +76,9 @@ class CFFICodeBuilder(CodeBuilder):
         from bindgen.ast import objects as obj
         Null = obj.Constructor.Null
 
-        ctor_name = func.parent.ffi_name('c')
-        ret_ty = func.ret_ty.ffi_name('c')
+        ir = writer.gen.ir
+        ctor_name = ir.ffi_name(func.parent, 'c')
+        ret_ty = ir.ffi_name(ir.ret_ty(func), 'c')
 
         if func.null == Null.nothrow:
             call_name = 'new(std::nothrow) %s' % (ctor_name)
@@ -101,55 +106,35 @@ class CFFIBindingGenerator(BindingGenerator):
     def generate(self, dest):
         path = dest / 'ffi.cpp'
 
-        self.makedir(path.parent)
-
-        with path.open('w+') as f:
+        with self.output(path) as f:
             gen = CCodeGenerator(self.root)
-            writer = CCodeWriter(gen, f)
-            builder = CFFICodeBuilder(writer)
-            self._generate(builder)
+            with CCodeWriter(gen, f) as writer:
+                builder = CFFICodeBuilder(writer)
+                builder.binding = self
+                self._generate(builder)
 
     def _generate(self, builder):
-        from bindgen.ast import objects as obj
+        from bindgen.ast.ir import Kind
         writer = builder.writer
+        ir = self.ir
 
-        # Includes
-        includes = set()
-
-        for item in self.root.traverse():
-            if isinstance(item, obj.Module):
-                includes |= item.includes
+        with self.phase('collect'):
+            emission = ir.emission()
 
+        # Includes
         writer.include('string', system=True)
-        for include in sorted(includes):
+        for include in sorted(emission.includes):
             writer.include(include)
         writer.writeln()
 
         # Write types
-        def traverse_types():
-            for item in self.root.traverse():
-                if isinstance(item, obj.Function):
-                    yield item.ret_ty
-
-                    for (arg_ty, arg_name) in item.arg_tys:
-                        yield arg_ty
-                elif isinstance(item, obj.Class):
-                    yield item
-                elif isinstance(item, obj.Module):
-                    yield from item.types
-
-        types = set()
-        for ty in traverse_types():
-            ty_name = ty.ffi_name('c')
-            if ty_name not in types:
-                ty.write_def('c', writer)
-                types.add(ty_name)
+        for ty in emission.types:
+            ir.types[ty].write_def('c', writer)
 
         # Methods/Functions
-        for item in self.root.traverse():
-            if isinstance(item, obj.Function):
-                writer.writeln()
-                builder.generate_function(item)
-            elif isinstance(item, obj.RawFunction):
-                writer.writeln()
-                item.generate(builder, 'c')
+        for i in emission.functions:
+            writer.writeln()
+            if ir.kinds[i] == Kind.RAW_FUNCTION:
+                ir.entities[i].generate(builder, 'c')
+            else:
+                builder.fragment('CFFI:%s' % (ir.c_names[i]), builder.fragment_inputs(i), builder.generate_function, ir.entities[i])
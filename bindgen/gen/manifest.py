@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+from bindgen.utils import write_if_changed
+
+# Incremental generation state, kept next to the generated files. It maps
+# every output file to the digest of the inputs it was generated from, and
+# every cached code fragment (a function shim, a class...) to the digest of
+# its inputs and where its text is in the outputs:
+#
+#   [inputs, text digest, output file, offset, length (in characters)]
+#
+# Fragments whose inputs did not change are read back from the previous
+# outputs instead of being generated again, as long as their text is still
+# there (its digest is checked).
+
+MANIFEST_NAME = '.bindgen-manifest.json'
+MANIFEST_VERSION = 2
+
+# Any change to the generators invalidates everything they generated
+def generator_digest():
+    import bindgen
+    from bindgen.snapshot import _python_files
+
+    h = hashlib.sha256()
+    for path in _python_files(os.path.dirname(bindgen.__file__)):
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+
+    return h.hexdigest()
+
+def digest(*parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+class Manifest(object):
+    def __init__(self, dest, data={}):
+        self.dest = str(dest)
+        self.generator = generator_digest()
+
+        if data.get('version') == MANIFEST_VERSION and data.get('generator') == self.generator:
+            self.old_files = data.get('files', {})
+            self.old_fragments = data.get('fragments', {})
+        else:
+            self.old_files = {}
+            self.old_fragments = {}
+
+        # Only what this run produced is saved, stale entries are dropped
+        self.files = {}
+        self.fragments = {}
+
+        self.reused = 0
+
+        # (path, text) of the last previous output read back
+        self._old_output = (None, None)
+        # (text, digest) of the last fragment reused
+        self._reused = (None, None)
+
+        self._relpaths = {}
+
+    @classmethod
+    def load(cls, dest):
+        try:
+            with open(os.path.join(str(dest), MANIFEST_NAME)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+
+        return cls(dest, data if isinstance(data, dict) else {})
+
+    def save(self):
+        data = {
+            'version': MANIFEST_VERSION,
+            'generator': self.generator,
+            'files': self.files,
+            'fragments': self.fragments,
+        }
+
+        os.makedirs(self.dest, exist_ok=True)
+        write_if_changed(os.path.join(self.dest, MANIFEST_NAME), json.dumps(data, sort_keys=True, separators=(',', ':')))
+
+    # Makes what this run produced the reference for the next one
+    def rollover(self):
+        self.old_files = self.files
+        self.old_fragments = self.fragments
+
+        self.files = {}
+        self.fragments = {}
+        self.reused = 0
+        self._old_output = (None, None)
+        self._reused = (None, None)
+
+    # Each fragment is recorded with its output path, they are resolved once
+    def relpath(self, path):
+        rel = self._relpaths.get(path)
+        if rel is None:
+            rel = self._relpaths[path] = os.path.relpath(str(path), self.dest).replace(os.sep, '/')
+        return rel
+
+    # Whether `path` was generated from the same inputs, and is still there
+    def is_fresh(self, path, inputs, exists=os.path.isfile):
+        rel = self.relpath(path)
+
+        if inputs is None or self.old_files.get(rel) != inputs or not exists(path):
+            return False
+
+        self.files[rel] = inputs
+        return True
+
+    def record_file(self, path, inputs):
+        if inputs is not None:
+            self.files[self.relpath(path)] = inputs
+
+    def fragment(self, key, inputs):
+        entry = self.old_fragments.get(key)
+        if entry is None or entry[0] != inputs:
+            return None
+
+        (inputs, text_hash, rel, start, length) = entry
+
+        # The output may have changed since, e.g. if it was generated again
+        text = self.old_output(rel)
+        if text is None:
+            return None
+
+        text = text[start:start + length]
+        if text_digest(text) != text_hash:
+            return None
+
+        # It is recorded again right after, see record_fragment()
+        self._reused = (text, text_hash)
+
+        self.reused += 1
+        return text
+
+    # Text of a file generated by the previous run, None if it is gone. Only
+    # the last one read is kept.
+    def old_output(self, rel):
+        if self._old_output[0] != rel:
+            try:
+                with open(os.path.join(self.dest, rel), encoding='utf-8', newline='') as f:
+                    text = f.read()
+            except (OSError, ValueError):
+                text = None
+
+            self._old_output = (rel, text)
+
+        return self._old_output[1]
+
+    def keep_fragment(self, key):
+        entry = self.old_fragments.get(key)
+        if entry is not None:
+            self.fragments[key] = entry
+
+    # `text` is at `start` in the output file `path`
+    def record_fragment(self, key, inputs, text, path, start):
+        (reused, text_hash) = self._reused
+        if reused is not text:
+            text_hash = text_digest(text)
+
+        self.fragments[key] = [inputs, text_hash, self.relpath(path), start, len(text)]
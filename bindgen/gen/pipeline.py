@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+
+# Bounded pipe between a renderer and an output stream (see
+# sink.OutputSink.open). The text written to it is handed to a writer thread,
+# which drains it to the stream while rendering goes on. At most `SIZE`
+# chunks are pending, the renderer waits for the writer beyond that, so
+# memory use does not grow with the output.
+#
+# All the pipes of a process share the same writer thread, started with the
+# first one (and again in forked workers, which do not inherit it).
+class OutputPipe(object):
+    SIZE = 16
+
+    # End markers, closing or discarding the output
+    _CLOSE = object()
+    _ABORT = object()
+
+    def __init__(self, stream):
+        self.stream = stream
+
+        self._writer = _Writer.get(self.SIZE)
+        self._done = threading.Event()
+        self._error = None
+        self._changed = None
+
+    def write(self, text):
+        if self._error is not None:
+            raise self._error
+
+        if len(text) > 0:
+            self._writer.put(self, text)
+
+    # Runs in the writer thread
+    def _drain(self, text):
+        if text is self._CLOSE or text is self._ABORT:
+            try:
+                if text is self._CLOSE and self._error is None:
+                    self._changed = self.stream.close()
+                else:
+                    self.stream.discard()
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._done.set()
+        elif self._error is None:
+            # Once failed, the rest is dropped until the renderer stops
+            try:
+                self.stream.write(text)
+            except BaseException as e:
+                self._error = e
+
+    def _finish(self, marker):
+        self._writer.put(self, marker)
+        self._done.wait()
+
+    # Waits for everything to be written, returns whether the output changed
+    def close(self):
+        self._finish(self._CLOSE)
+
+        if self._error is not None:
+            raise self._error
+        return self._changed
+
+    # Stops writing, leaving the output as it was
+    def abort(self):
+        self._finish(self._ABORT)
+
+# Writer thread shared by the pipes of a process, draining their chunks in
+# the order they were written
+class _Writer(object):
+    _current = None
+
+    def __init__(self, size):
+        self.pid = os.getpid()
+
+        self._queue = queue.Queue(size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get(cls, size):
+        writer = cls._current
+        if writer is None or writer.pid != os.getpid():
+            writer = cls._current = cls(size)
+        return writer
+
+    def put(self, pipe, text):
+        self._queue.put((pipe, text))
+
+    def _run(self):
+        chunks = self._queue
+
+        while True:
+            (pipe, text) = chunks.get()
+            pipe._drain(text)
@@ -10,50 +10,43 @@ class RustCodeWriter(CodeWriter):
 
     @contextmanager
     def function(self, *args, **kwargs):
-        self.write(self.gen.declare_function(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.declare_function(*args, **kwargs)))
         with self.block():
             yield
 
     @contextmanager
     def extern(self, *args, **kwargs):
-        self.write(self.gen.extern(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.extern(*args, **kwargs)))
         with self.block():
             yield
 
     @contextmanager
     def trait(self, *args, **kwargs):
-        self.write(self.gen.trait(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.trait(*args, **kwargs)))
         with self.block():
             yield
 
     @contextmanager
     def impl(self, *args, **kwargs):
-        self.write(self.gen.impl(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.impl(*args, **kwargs)))
         with self.block():
             yield
 
     @contextmanager
     def mod(self, *args, **kwargs):
-        self.write(self.gen.mod(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.mod(*args, **kwargs)))
         with self.block():
             yield
 
     @contextmanager
     def unsafe(self, *args, **kwargs):
-        self.write(self.gen.unsafe(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.unsafe(*args, **kwargs)))
         with self.block():
             yield
 
     @contextmanager
     def match(self, *args, **kwargs):
-        self.write(self.gen.match(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.match(*args, **kwargs)))
         with self.block():
             yield
 
@@ -65,8 +58,7 @@ class RustCodeWriter(CodeWriter):
 
     @contextmanager
     def cond(self, *args, **kwargs):
-        self.write(self.gen.cond(*args, **kwargs))
-        self.write(' ')
+        self.write('%s ' % (self.gen.cond(*args, **kwargs)))
         with self.block():
             yield
 
@@ -1,7 +1,6 @@
 from .codegen import RustCodeGenerator
 from .codewriter import RustCodeWriter
 from .. import BindingGenerator, CodeBuilder
-from .. import utils as gen_utils
 
 class RustFFICodeBuilder(CodeBuilder):
     def generate_ffi_function(self, func):
@@ -14,127 +13,131 @@ class RustFFICodeBuilder(CodeBuilder):
         self._generate_mod(self.writer, mod)
 
     def _generate_ffi_function(self, writer, func):
-        name = gen_utils.c_name(func.path)
-        ret_ty = func.ret_ty.ffi_name('rust', path=['super'])
+        ir = writer.gen.ir
+
+        name = ir.c_name(func)
+        ret_ty = ir.ffi_name(ir.ret_ty(func), 'rust', path=['super'])
 
         args = []
-        for (arg_ty, arg_name) in func.arg_tys:
-            arg_ty = arg_ty.ffi_name('rust', path=['super'])
+        for (arg_ty, arg_name) in ir.arg_tys(func):
+            arg_ty = ir.ffi_name(arg_ty, 'rust', path=['super'])
 
             args.append((arg_ty, arg_name))
 
         writer.declare_function(name, ret_ty, args)
 
     def _generate_mod(self, writer, mod):
-        from bindgen.ast import objects as obj
-
-        for item in sorted(mod.items, key=lambda item: item.name):
-            if isinstance(item, obj.Namespace):
-                writer.writeln()
-                with writer.mod(item.name):
-                    writer.use(['super', 'raw'])
-
-                    self.generate_mod(item)
-            elif isinstance(item, obj.Module):
-                self.generate_mod(item)
-            elif isinstance(item, obj.Function):
-                writer.writeln()
-                self.generate_function(item)
-            elif isinstance(item, obj.RawFunction):
-                writer.writeln()
+        from contextlib import ExitStack
+        from bindgen.ast.ir import Kind
+
+        ir = writer.gen.ir
+        mod_id = ir.id_of(mod)
+        if mod_id == ir.NO_ID:
+            raise KeyError('%s is not in the sealed tree' % (ir.cpp_name(mod)))
+
+        # Namespaces are nested as they come in traversal order, each one is
+        # closed once the walk leaves it
+        mods = []
+        for i in ir.emission(by_name=True, own_types=(Kind.CLASS, Kind.ENUM)).walk_within(mod_id):
+            while len(mods) > 0 and mods[-1][0] != ir.namespaces[i]:
+                mods.pop()[1].close()
+
+            kind = ir.kinds[i]
+            item = ir.entities[i]
+
+            writer.writeln()
+            if kind == Kind.NAMESPACE:
+                ns = ExitStack()
+                ns.enter_context(writer.mod(ir.names[i]))
+                mods.append((i, ns))
+
+                writer.use(['super', 'raw'])
+            elif kind == Kind.RAW_FUNCTION:
                 item.generate(self, 'rust_ffi')
+            else:
+                self.fragment('RustFFI:fn:%s' % (ir.c_names[i]), self.fragment_inputs(i), self.generate_function, item)
+
+        while len(mods) > 0:
+            mods.pop()[1].close()
 
     def _generate_function(self, writer, func):
         from bindgen.ast import objects as obj
 
-        path = func.namespace.path[1:]
+        ir = writer.gen.ir
+        ret_ty = ir.ret_ty(func)
+        arg_tys = ir.arg_tys(func)
+
+        path = ir.path(ir.namespace(func))[1:]
         super = ['super'] * len(path)
-        writer.comment(gen_utils.cpp_name(func.path))
+        writer.comment(ir.cpp_name(func))
 
-        name = func.name
-        if isinstance(func, (obj.Method, obj.StaticMethod)):
-            name = gen_utils.c_name(func.path[-2:])
+        name = ir.rust_ffi_name(func)
 
-        if func.ret_ty == obj.Bool:
+        if ret_ty == obj.Bool:
             ret_ty = 'bool'
         else:
-            ret_ty = func.ret_ty.ffi_name('rust', path=super)
+            ret_ty = ir.ffi_name(ret_ty, 'rust', path=super)
 
         args = []
-        for (arg_ty, arg_name) in func.arg_tys:
+        for (arg_ty, arg_name) in arg_tys:
             if isinstance(arg_ty, obj.Option):
                 arg_ty = arg_ty.subtype
 
             if arg_ty == obj.Bool:
                 arg_ty = 'bool'
             else:
-                arg_ty = arg_ty.ffi_name('rust', path=super)
+                arg_ty = ir.ffi_name(arg_ty, 'rust', path=super)
 
             args.append((arg_ty, arg_name))
 
         writer.attr('inline', ['always'])
         with writer.function(name, ret_ty, args, unsafe=True):
             # Call function
-            call_args = [arg_ty.transform('rust', arg_name) for (arg_ty, arg_name) in func.arg_tys]
+            call_args = [arg_ty.transform('rust', arg_name) for (arg_ty, arg_name) in arg_tys]
 
-            call_name = 'raw::%s' % (gen_utils.c_name(func.path))
+            call_name = 'raw::%s' % (ir.c_name(func))
             ret = writer.gen.call(call_name, call_args)
-            ret = func.ret_ty.transform('rust', ret, out=True)
+            ret = ir.ret_ty(func).transform('rust', ret, out=True)
             writer.expr(ret)
 
 class RustFFIBindingGenerator(BindingGenerator):
     def generate(self, dest):
         path = dest / 'ffi.rs'
 
-        self.makedir(path.parent)
-
-        with path.open('w+') as f:
+        with self.output(path) as f:
             gen = RustCodeGenerator(self.root)
             gen.pub = True
-            writer = RustCodeWriter(gen, f)
-            builder = RustFFICodeBuilder(writer)
-            self._generate(builder)
+            with RustCodeWriter(gen, f) as writer:
+                builder = RustFFICodeBuilder(writer)
+                builder.binding = self
+                self._generate(builder)
 
     def _generate(self, builder):
-        from bindgen.ast import objects as obj
+        from bindgen.ast.ir import Kind
 
         writer = builder.writer
+        ir = self.ir
 
         # Writer header
         writer.attr('allow', ['non_camel_case_types', 'non_snake_case', 'unstable'], glob=True)
         writer.writeln()
 
+        with self.phase('collect'):
+            emission = ir.emission(by_name=True, own_types=(Kind.CLASS, Kind.ENUM))
+
         # Write types
-        def traverse_types():
-            for item in sorted(self.root.traverse(), key=lambda item: item.name):
-                if isinstance(item, obj.Function):
-                    yield item.ret_ty
-
-                    for (arg_ty, arg_name) in item.arg_tys:
-                        yield arg_ty
-                elif isinstance(item, obj.Class):
-                    yield item
-                elif isinstance(item, obj.Module):
-                    yield from item.types
-                elif isinstance(item, obj.Enum):
-                    yield item
-
-        types = set()
-        for ty in traverse_types():
-            ty_name = ty.ffi_name('rust')
-            if ty_name not in types:
-                ty.write_def('rust', writer)
-                types.add(ty_name)
+        for ty in emission.types:
+            ir.types[ty].write_def('rust', writer)
 
         # FFI functions
         writer.writeln()
         with writer.mod('raw', pub=False):
             with writer.extern('C'):
-                for item in sorted(self.root.traverse(), key=lambda item: item.name):
-                    if isinstance(item, obj.Function):
-                        builder.generate_ffi_function(item)
-                    elif isinstance(item, obj.RawFunction):
-                        item.generate(builder, 'rust_ffi', decl=True)
+                for i in emission.functions:
+                    if ir.kinds[i] == Kind.RAW_FUNCTION:
+                        ir.entities[i].generate(builder, 'rust_ffi', decl=True)
+                    else:
+                        builder.fragment('RustFFI:decl:%s' % (ir.c_names[i]), builder.fragment_inputs(i), builder.generate_ffi_function, ir.entities[i])
 
         builder.generate_mod(self.root)
         self.root.extra('rust', writer)
@@ -23,6 +23,10 @@ class RustLibCodeBuilder(CodeBuilder):
 
         self.tree = tree
 
+    @property
+    def hierarchy(self):
+        return self.writer.gen.root.hierarchy
+
     def generate_trait(self, item):
         self._generate_trait(self.writer, item)
 
@@ -64,7 +68,7 @@ class RustLibCodeBuilder(CodeBuilder):
         from bindgen.ast import objects as obj
 
         enum_name = enum.name
-        ffi_enum_name = enum.ffi_name('rust', path=['', 'ffi'])
+        ffi_enum_name = writer.gen.ir.ffi_name(enum, 'rust', path=['', 'ffi'])
 
         # Writer enum
         values = []
@@ -136,25 +140,21 @@ class RustLibCodeBuilder(CodeBuilder):
         struct_name = RustLibConstants.STRUCT_NAME.format(name=cls.name)
         inner_name = RustLibConstants.INNER_NAME.format(name=cls.name)
 
-        destructor = cls.destructor
+        destructor = self.hierarchy.destructor(cls)
 
         # Generate enums
-        for it in sorted(cls.items, key=lambda item: item.name):
+        for it in cls.ordered_items:
             if isinstance(it, obj.Enum):
                 self.generate_enum(it)
 
         # Generate inner type
-        ffi_typename = '::ffi::%s' % (cls.ffi_name('rust'))
+        ffi_typename = '::ffi::%s' % (writer.gen.ir.ffi_name(cls, 'rust'))
         ffi_ptr_typename = '*mut %s' % (inner_name)
 
         writer.typedef(inner_name, ffi_typename)
 
         # Generate traits
-        def base_cmp(base):
-            def _cmp(item):
-                return item.item == base
-            return _cmp
-        bases = [tree.root.find(base_cmp(base)) for base in cls.bases]
+        bases = [tree.find_item(base) for base in cls.bases]
         bases = [[''] + base.fullpath for base in bases]
         bases = ['::'.join(base) for base in bases]
         bases = [RustLibConstants.INNER_TRAIT_NAME.format(name=base) for base in bases]
@@ -180,7 +180,7 @@ class RustLibCodeBuilder(CodeBuilder):
         # Generate ext trait
         writer.writeln()
         with writer.trait(ext_trait_name, [inner_trait_name]):
-            for it in sorted(cls.items, key=lambda item: item.name):
+            for it in cls.ordered_items:
                 if isinstance(it, obj.Function) and not isinstance(it, (obj.StaticMethod, obj.Destructor)):
                     self.generate_function(it)
                 elif isinstance(it, obj.RawFunction):
@@ -201,26 +201,14 @@ class RustLibCodeBuilder(CodeBuilder):
         writer.struct(struct_name, members)
 
         # Implement bases
-        def find_bases_tree(cls):
-            bases = []
-
-            for base in cls.bases:
-                if bases in bases:
-                    continue
-
-                bases += find_bases_tree(base)
-                bases.append(base)
-
-            return bases
-        bases = find_bases_tree(cls)
-        bases = [tree.root.find(base_cmp(base)) for base in bases]
+        bases = [tree.find_item(base) for base in self.hierarchy.bases(cls)]
 
         for base in bases:
             base_path = [''] + base.fullpath
             base_name = '::'.join(base_path)
             base_name = RustLibConstants.INNER_TRAIT_NAME.format(name=base_name)
 
-            base_ffi_typename = '::ffi::%s' % (base.item.ffi_name('rust'))
+            base_ffi_typename = '::ffi::%s' % (writer.gen.ir.ffi_name(base.item, 'rust'))
 
             with writer.impl(struct_name, base_name):
                 writer.attr('inline', ['always'])
@@ -247,7 +235,7 @@ class RustLibCodeBuilder(CodeBuilder):
                 writer.init_struct(struct_name, members)
 
             # Static methods
-            for it in sorted(cls.items, key=lambda item: item.name):
+            for it in cls.ordered_items:
                 if isinstance(it, obj.StaticMethod):
                     self.generate_function(it, pub=True)
                 elif isinstance(it, obj.RawFunction):
@@ -259,7 +247,7 @@ class RustLibCodeBuilder(CodeBuilder):
             with writer.impl(struct_name, 'Drop'):
                 writer.attr('inline', ['always'])
                 with writer.function('drop', args=['&mut self'], pub=False):
-                    cls_path = destructor.path[:-1]
+                    cls_path = writer.gen.ir.path(destructor)[:-1]
                     ffi_name = '::ffi' + '%s_%s' % ('::'.join(cls_path), destructor.name)
                     call_name = ffi_name
                     inner = get_inner_static(tree, writer, obj.Pointer(destructor.parent), 'self')
@@ -295,6 +283,9 @@ class RustLibCodeBuilder(CodeBuilder):
 
         pub = kwargs.get('pub', False)
 
+        ir = writer.gen.ir
+        ret_ty = ir.ret_ty(func)
+
         # Some util functions
         is_null = self.is_null
 
@@ -302,15 +293,15 @@ class RustLibCodeBuilder(CodeBuilder):
             return get_inner(tree, *args, **kwargs)
 
         name = camelcase_to_underscore(func.name)
-        ret_tyname = tree.resolve_type(func.ret_ty, impl=True)
+        ret_tyname = tree.resolve_type(ret_ty, impl=True)
         ty_params = []
         args = []
 
-        if is_null(func.ret_ty, obj.Pointer.Null.option):
+        if is_null(ret_ty, obj.Pointer.Null.option):
             ret_tyname = 'Option<%s>' % (ret_tyname)
 
         # Build args list
-        arg_tys = func.arg_tys
+        arg_tys = ir.arg_tys(func)
         if isinstance(func, obj.Method):
             if func.const:
                 arg = '&self'
@@ -400,13 +391,13 @@ class RustLibCodeBuilder(CodeBuilder):
                     cls = func.parent
                     self_arg = get_inner_proxy(writer, obj.Pointer(cls), 'self')
                     if func.const:
-                        ffi_typename = '::ffi::%s' % (cls.ffi_name('rust'))
+                        ffi_typename = '::ffi::%s' % (writer.gen.ir.ffi_name(cls, 'rust'))
                         self_arg = writer.gen.cast(self_arg, '*const %s' % (ffi_typename))
                     call_args.insert(0, self_arg)
 
-                ffi_name = '::'.join(func.path)
+                ffi_name = ir.cpp_name(func)
                 if isinstance(func, (obj.Method, obj.StaticMethod)):
-                    cls_path = func.path[:-1]
+                    cls_path = ir.path(func)[:-1]
                     ffi_name = '%s_%s' % ('::'.join(cls_path), func.name)
                 ffi_name = '::ffi' + ffi_name
                 call_name = ffi_name
@@ -414,47 +405,50 @@ class RustLibCodeBuilder(CodeBuilder):
                 ret = writer.gen.call(call_name, call_args)
 
                 # Do final transforms to return value
-                if func.ret_ty == obj.Void:
+                if ret_ty == obj.Void:
                     writer.expr(ret, discard=True)
                     return
 
-                if isinstance(func.ret_ty, obj.ConvertibleType):
+                if isinstance(ret_ty, obj.ConvertibleType):
                     writer.declare_var('ret', init=ret)
-                    ret = func.ret_ty.convert_from_ffi(writer, 'rust', 'ret', get_inner=get_inner_proxy)
+                    ret = ret_ty.convert_from_ffi(writer, 'rust', 'ret', get_inner=get_inner_proxy)
 
-                ret = func.ret_ty.transform('rustlib', ret, out=True)
+                ret = ret_ty.transform('rustlib', ret, out=True)
 
                 writer.declare_var('ret', init=ret)
                 ret = 'ret'
 
-                self.check_ptr(func.ret_ty, ret, '::'.join(func.path))
+                self.check_ptr(ret_ty, ret, ir.cpp_name(func))
 
-                if obj.is_class_type(func.ret_ty):
-                    cls = func.ret_ty.subtype
+                if obj.is_class_type(ret_ty):
+                    cls = ret_ty.subtype
 
                     name = RustLibConstants.STRUCT_NAME.format(name=tree.resolve_type(cls))
                     from_inner = writer.gen.member(name, 'from_inner', static=True)
-                    if func.ret_ty.const:
-                        ret_ffi_typename = '::ffi::%s' % (cls.ffi_name('rust'))
+                    if ret_ty.const:
+                        ret_ffi_typename = '::ffi::%s' % (writer.gen.ir.ffi_name(cls, 'rust'))
                         ret = writer.gen.cast(ret, '*mut %s' % (ret_ffi_typename))
 
                     args = [ret]
-                    if cls.destructor is not None:
+                    if self.hierarchy.destructor(cls) is not None:
                         owned = isinstance(func, obj.Constructor)
-                        if isinstance(func.ret_ty, obj.Pointer):
-                            owned |= func.ret_ty.owned
+                        if isinstance(ret_ty, obj.Pointer):
+                            owned |= ret_ty.owned
 
                         owned = 'true' if owned else 'false'
                         args.append(owned)
 
                     ret = writer.gen.call(from_inner, args)
 
-                if is_null(func.ret_ty, obj.Pointer.Null.option):
+                if is_null(ret_ty, obj.Pointer.Null.option):
                     ret = 'Some(%s)' % (ret)
 
                 writer.expr(ret)
 
 class RustLibBindingGenerator(BindingGenerator):
+    # Module files are rendered concurrently, see _generate_tree()
+    own_pool = True
+
     def __init__(self, root):
         super().__init__(root)
 
@@ -462,38 +456,35 @@ class RustLibBindingGenerator(BindingGenerator):
         self.gen.pub = True
 
     def generate(self, dest):
-        tree = make_tree(self.root)
+        with self.phase('make_tree'):
+            tree = make_tree(self.root)
 
         # Generate entry file
         path = dest / 'lib.rs'
-        self.makedir(path.parent)
-
-        with path.open('w+') as f:
-            writer = RustCodeWriter(self.gen, f)
-            builder = RustLibCodeBuilder(writer, tree)
-            writer.attr('experimental', glob=True)
-            writer.attr('allow', ['unstable'], glob=True)
-            # writer.attr('no_std', glob=True)
-            writer.writeln()
-            writer.extern_crate('core')
-            writer.extern_crate('libc')
-            self._generate_tree_uses(builder)
-            writer.writeln()
-            writer.declare_mod('ffi')
-            writer.declare_mod('traits')
-            self._generate_tree_def(builder)
+        with self.output(path) as f:
+            with RustCodeWriter(self.gen, f) as writer:
+                builder = RustLibCodeBuilder(writer, tree)
+                writer.attr('experimental', glob=True)
+                writer.attr('allow', ['unstable'], glob=True)
+                # writer.attr('no_std', glob=True)
+                writer.writeln()
+                writer.extern_crate('core')
+                writer.extern_crate('libc')
+                self._generate_tree_uses(builder)
+                writer.writeln()
+                writer.declare_mod('ffi')
+                writer.declare_mod('traits')
+                self._generate_tree_def(builder)
 
         # Generate tree
         self._generate_tree(tree, dest)
 
         # Generate traits file
         path = dest / 'traits.rs'
-        self.makedir(path.parent)
-
-        with path.open('w+') as f:
-            writer = RustCodeWriter(self.gen, f)
-            builder = RustLibCodeBuilder(writer, tree)
-            self._generate_traits(builder, tree)
+        with self.output(path) as f:
+            with RustCodeWriter(self.gen, f) as writer:
+                builder = RustLibCodeBuilder(writer, tree)
+                self._generate_traits(builder, tree)
 
     def _generate_traits(self, builder, tree):
         from bindgen.ast import objects as obj
@@ -521,26 +512,124 @@ class RustLibBindingGenerator(BindingGenerator):
             writer.declare_mod(name)
 
     def _generate_tree(self, tree, path):
+        from bindgen.utils import fork_imap
+
+        files = []
+        for (subtree, fpath) in self._tree_files(tree, path):
+            inputs = self._tree_inputs(subtree)
+            if self.is_fresh(fpath, inputs):
+                # Keep the cached items for the next time this file changes
+                for item in subtree.items:
+                    self.manifest.keep_fragment(self._item_key(item))
+            else:
+                files.append((subtree, fpath, inputs))
+
+        if self.jobs <= 1:
+            for (subtree, fpath, inputs) in files:
+                with self.output(fpath, inputs) as f:
+                    self._render_tree(subtree, f)
+            return
+
+        # Module files only read the tree, they can be rendered concurrently,
+        # and are then written in order as they come
+        rendered = fork_imap(self._render_tree_file, [(subtree, fpath) for (subtree, fpath, inputs) in files], self.jobs)
+
+        for ((subtree, fpath, inputs), (text, fragments, reused)) in zip(files, rendered):
+            if self.manifest is not None:
+                self.manifest.fragments.update(fragments)
+                self.manifest.reused += reused
+            self.write_output(fpath, text, inputs)
+
+    # Module files of a tree, each subtree before its parent
+    def _tree_files(self, tree, path):
         for (name, subtree) in tree.subtrees.items():
             subpath = path / name
-            self._generate_tree(subtree, subpath)
+            yield from self._tree_files(subtree, subpath)
 
         if len(tree.items) > 0:
             if len(tree.subtrees) > 0:
                 fpath = path / 'mod.rs'
             else:
                 fpath = path.with_suffix('.rs')
-            self.makedir(fpath.parent)
 
-            with fpath.open('w+') as f:
-                writer = RustCodeWriter(self.gen, f)
-                builder = RustLibCodeBuilder(writer, tree)
-                self._generate_tree_uses(builder)
-                self._generate_tree_def(builder)
-                self._generate_tree_items(builder)
+            yield (tree, fpath)
+
+    # Returns the module file text, the fragments it added to the manifest,
+    # and how many it reused. The caller records them, the manifest is left
+    # as it was.
+    def _render_tree_file(self, tree, path):
+        from io import StringIO
+
+        manifest = self.manifest
+        if manifest is not None:
+            (fragments, manifest.fragments) = (manifest.fragments, {})
+            reused = manifest.reused
+
+        f = StringIO()
+        with self.rendering(path):
+            self._render_tree(tree, f)
+
+        (added, used) = ({}, 0)
+        if manifest is not None:
+            (added, used) = (manifest.fragments, manifest.reused - reused)
+            (manifest.fragments, manifest.reused) = (fragments, reused)
+
+        return (f.getvalue(), added, used)
+
+    def _render_tree(self, tree, f):
+        with RustCodeWriter(self.gen, f) as writer:
+            builder = RustLibCodeBuilder(writer, tree)
+            builder.binding = self
+            self._generate_tree_uses(builder)
+            self._generate_tree_def(builder)
+            self._generate_tree_items(builder)
+
+    def _item_key(self, item):
+        return '%s:%s' % (type(self).__name__, '::'.join(item.fullpath))
+
+    # Inputs of the code generated for a tree item: its subtree, and for
+    # classes the bases whose traits it implements
+    def _item_inputs(self, item):
+        from bindgen.ast import objects as obj
+        from ..manifest import digest
+
+        if self.manifest is None:
+            return None
+
+        ir = self.ir
+        i = ir.id_of(item.item)
+        if i == ir.NO_ID or ir.opaque[i]:
+            return None
+
+        inputs = [ir.fingerprints[i]]
+        if isinstance(item.item, obj.Class):
+            for base in self.root.hierarchy.bases(item.item):
+                base_id = ir.id_of(base)
+                if base_id == ir.NO_ID:
+                    return None
+                inputs.append(ir.local_fingerprints[base_id])
+
+        return digest(*inputs)
+
+    def _tree_inputs(self, tree):
+        from ..manifest import digest
+        from .tree import item_key
+
+        if self.manifest is None:
+            return None
+
+        items = []
+        for item in sorted(tree.items, key=item_key):
+            inputs = self._item_inputs(item)
+            if inputs is None:
+                return None
+            items.append((item.item.name, inputs))
+
+        return digest(tree.path, list(tree.subtrees.keys()), items)
 
     def _generate_tree_items(self, builder):
         from bindgen.ast import objects as obj
+        from functools import partial
         from .tree import ty_filter, item_key
 
         writer = builder.writer
@@ -549,16 +638,19 @@ class RustLibBindingGenerator(BindingGenerator):
         def sorted_filter(_filter, key, items):
             return sorted(filter(_filter, items), key=key)
 
+        def fragment(item, render, *args, **kwargs):
+            builder.fragment(self._item_key(item), self._item_inputs(item), partial(render, *args, **kwargs))
+
         # Write classes
         for item in sorted_filter(ty_filter(obj.Enum), item_key, tree.items):
-            builder.generate_enum(item.item)
+            fragment(item, builder.generate_enum, item.item)
 
         for item in sorted_filter(ty_filter(obj.Class), item_key, tree.items):
-            builder.generate_class(item.item)
+            fragment(item, builder.generate_class, item.item)
 
         for item in sorted_filter(ty_filter((obj.Function, obj.RawFunction)), item_key, tree.items):
             if isinstance(item.item, obj.RawFunction):
                 writer.writeln()
                 item.item.generate(builder, 'rust')
             else:
-                builder.generate_function(item.item, pub=True)
+                fragment(item, builder.generate_function, item.item, pub=True)
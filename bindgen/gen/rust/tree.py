@@ -5,11 +5,20 @@ class ModTree(object):
         self.subtrees = OrderedDict()
         self.items = []
 
+        # AST item -> ModItem and sealed AST, only set on the root tree
+        self.lookup = {}
+        self.ir = None
+
     def get(self, name, default=None):
         return self.subtrees.get(name, default)
 
     def add(self, item):
-        self.items.append(ModItem(self, item))
+        mod_item = ModItem(self, item)
+        self.items.append(mod_item)
+        self.root.lookup.setdefault(item, mod_item)
+
+    def find_item(self, item):
+        return self.root.lookup.get(item)
 
     def find(self, pred):
         for item in self.items:
@@ -33,7 +42,7 @@ class ModTree(object):
                 else:
                     fmt = RustLibConstants.INNER_TRAIT_NAME
             return fmt.format(name=name)
-        return ty.lib_name('rust', tree=self)
+        return self.root.ir.lib_name(ty, 'rust', tree=self)
 
     @property
     def path(self):
@@ -72,9 +81,10 @@ class ModItem(object):
 
 def make_tree(root):
     from bindgen.ast import objects as obj
-    from bindgen.ast.utils import get_modpath
 
+    ir = root.seal()
     tree = ModTree()
+    tree.ir = ir
 
     def add_item(path, value):
         current = tree
@@ -95,7 +105,7 @@ def make_tree(root):
         if item == root:
             continue
 
-        path = get_modpath(item)
+        path = ir.modpath(item)
         add_item(path, item)
 
     return tree
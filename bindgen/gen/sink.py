@@ -0,0 +1,76 @@
+import os
+from bindgen.utils import ChangedFileWriter, write_if_changed
+
+# Where BindingGenerator outputs go. Generators build their output paths from
+# the `dest` given to generate(), and hand the rendered files to their sink.
+class OutputSink(object):
+    # Stores `text` at `path`, returns whether anything changed
+    def write(self, path, text):
+        raise NotImplementedError('OutputSink.write')
+
+    def exists(self, path):
+        raise NotImplementedError('OutputSink.exists')
+
+    # Stream storing the text written to it at `path`, close() returns
+    # whether anything changed and discard() drops it. By default the text
+    # is gathered and stored with write().
+    def open(self, path):
+        return BufferedStream(self, path)
+
+    def makedir(self, path):
+        pass
+
+# Real files, only rewritten when their content changes (the default)
+class DiskSink(OutputSink):
+    def write(self, path, text):
+        self.makedir(path.parent)
+        return write_if_changed(str(path), text)
+
+    def exists(self, path):
+        return os.path.isfile(str(path))
+
+    def open(self, path):
+        self.makedir(path.parent)
+        return ChangedFileWriter(str(path))
+
+    def makedir(self, path):
+        # Concurrent generators (-j) may create the same directories
+        path.mkdir(parents=True, exist_ok=True)
+
+# Collects the outputs as {relative_path: text}, relative to `dest` and with
+# `/` separators, without touching the filesystem
+class MemorySink(OutputSink):
+    def __init__(self, dest='.'):
+        self.dest = str(dest)
+        self.files = {}
+
+    def relpath(self, path):
+        return os.path.relpath(str(path), self.dest).replace(os.sep, '/')
+
+    def write(self, path, text):
+        path = self.relpath(path)
+
+        changed = self.files.get(path) != text
+        self.files[path] = text
+        return changed
+
+    def exists(self, path):
+        return self.relpath(path) in self.files
+
+class BufferedStream(object):
+    def __init__(self, sink, path):
+        self.sink = sink
+        self.path = path
+
+        self._chunks = []
+
+    def write(self, text):
+        self._chunks.append(text)
+
+    def close(self):
+        text = ''.join(self._chunks)
+        self._chunks = []
+        return self.sink.write(self.path, text)
+
+    def discard(self):
+        self._chunks = []
@@ -0,0 +1,150 @@
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Wall clock timings of the generation phases (loading the description,
+# sealing the tree, each generator, each output file...). Phases nest, each
+# one is recorded with the phases it ran, and the whole run is saved as a
+# JSON report:
+#
+#   {"seconds": 1.2, "phases": [
+#       {"phase": "generate", "generator": "CFFIBindingGenerator", "seconds": 0.4, "phases": [
+#           {"phase": "file", "path": "ffi.cpp", "seconds": 0.4}
+#       ]},
+#       ...
+#   ]}
+class Profiler(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+
+        self.phases = []
+        self._stack = [self.phases]
+
+    @contextmanager
+    def phase(self, name, **attrs):
+        record = dict(phase=name, **attrs)
+        self._stack[-1].append(record)
+
+        children = []
+        self._stack.append(children)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if len(children) > 0:
+                record['phases'] = children
+            self._stack.pop()
+
+    # Adds phases recorded by another profiler (e.g. in a worker process)
+    # to the current phase
+    def extend(self, phases):
+        self._stack[-1].extend(phases)
+
+    def report(self):
+        return {
+            'seconds': time.perf_counter() - self.started,
+            'phases': self.phases,
+        }
+
+    def save(self, path):
+        with open(str(path), 'w') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write('\n')
+
+# Also records the memory of each phase, as traced by tracemalloc: the peak
+# (total, in bytes) reached during the phase, and what the phase retained
+# once done. The phases in `breakdown` also report the live objects they
+# retained by type (AST entities and types, ModItem, containers...), counted
+# with their shallow size:
+#
+#   {"phase": "make_tree", "seconds": 0.1, "peak_bytes": 41943040, "retained_bytes": 2097152,
+#    "types": {"ModItem": {"count": 3000, "bytes": 144000}, ...}}
+#
+# Tracing slows everything down, timings are only indicative in this mode.
+class MemoryProfiler(Profiler):
+    BREAKDOWN = ('import', 'seal', 'generate', 'make_tree', 'collect')
+
+    # Types reported per phase, those retaining the most
+    TOP_TYPES = 20
+
+    def __init__(self, breakdown=BREAKDOWN):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        super().__init__()
+        self.breakdown = breakdown
+
+        # Peak of the running phases, tracemalloc only has a global one
+        self._peaks = [0]
+
+    @contextmanager
+    def phase(self, name, **attrs):
+        objects = None
+        if name in self.breakdown:
+            objects = object_sizes()
+
+        (start, peak) = tracemalloc.get_traced_memory()
+        self._peaks[-1] = max(self._peaks[-1], peak)
+        tracemalloc.reset_peak()
+        self._peaks.append(start)
+
+        with super().phase(name, **attrs) as record:
+            try:
+                yield record
+            finally:
+                (end, peak) = tracemalloc.get_traced_memory()
+                peak = max(peak, self._peaks.pop())
+                self._peaks[-1] = max(self._peaks[-1], peak)
+
+                record['peak_bytes'] = peak
+                record['retained_bytes'] = end - start
+
+                if objects is not None:
+                    record['types'] = retained_objects(objects, object_sizes(), self.TOP_TYPES)
+
+    def report(self):
+        report = super().report()
+        report['peak_bytes'] = max(self._peaks[0], tracemalloc.get_traced_memory()[1])
+        return report
+
+# ({type name: count}, {type name: bytes}) of the objects tracked by the
+# collector. Only ints are stored, so that the snapshots do not count each
+# other.
+def object_sizes():
+    counts = {}
+    sizes = {}
+    for o in gc.get_objects():
+        name = type(o).__qualname__
+        counts[name] = counts.get(name, 0) + 1
+        sizes[name] = sizes.get(name, 0) + sys.getsizeof(o)
+
+    return (counts, sizes)
+
+# Objects in `after` but not in `before`, the `top` largest types first
+def retained_objects(before, after, top):
+    (old_counts, old_sizes) = before
+    (counts, sizes) = after
+
+    retained = []
+    for (name, count) in counts.items():
+        count -= old_counts.get(name, 0)
+        size = sizes[name] - old_sizes.get(name, 0)
+        if count != 0 or size != 0:
+            retained.append((name, count, size))
+
+    retained.sort(key=lambda entry: entry[2], reverse=True)
+    return {name: {'count': count, 'bytes': size} for (name, count, size) in retained[:top]}
+
+# Runs a phase on `profiler`, or does nothing if it is None
+@contextmanager
+def phase(profiler, name, **attrs):
+    if profiler is None:
+        yield None
+    else:
+        with profiler.phase(name, **attrs) as record:
+            yield record
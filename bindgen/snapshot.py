@@ -0,0 +1,204 @@
+import hashlib
+import os
+import pickle
+import sys
+
+# Bump when the layout of the pickled AST changes
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MAGIC = b'bindgen-snapshot\n'
+
+class SnapshotError(Exception):
+    pass
+
+def _new_entity(cls):
+    return cls.__new__(cls)
+
+# The AST is a densely linked graph (parents, bases, class pointers...), and
+# pickling it as-is recurses once per link. Entities are instead written in
+# two passes: first empty shells, then their states, which by then only
+# refer to already pickled shells.
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, excluded_modules):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.excluded_modules = excluded_modules
+        self.shells = False
+
+    def reducer_override(self, obj):
+        from bindgen.ast.objects import Entity
+
+        # Classes and functions are pickled by reference, loading them back
+        # would import (and so execute) the description modules again.
+        if isinstance(obj, type) or callable(obj) and hasattr(obj, '__qualname__'):
+            module = getattr(obj, '__module__', None)
+            if module in self.excluded_modules:
+                raise SnapshotError('%s.%s is defined by the description' % (module, obj.__qualname__))
+        elif self.shells and isinstance(obj, Entity):
+            return (_new_entity, (type(obj),))
+
+        return NotImplemented
+
+    def dump_tree(self, root):
+        entities = _collect_entities(root)
+
+        self.shells = True
+        self.dump(entities)
+        self.shells = False
+
+        self.dump([entity.__getstate__() for entity in entities])
+
+def _entity_refs(value):
+    from bindgen.ast import objects as obj
+    from functools import partial
+
+    if isinstance(value, obj.Entity):
+        yield value
+    elif isinstance(value, obj.InternedType):
+        for arg in value._args():
+            yield from _entity_refs(arg)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            yield from _entity_refs(item)
+    elif isinstance(value, dict):
+        for (key, item) in value.items():
+            yield from _entity_refs(key)
+            yield from _entity_refs(item)
+    elif isinstance(value, partial):
+        yield from _entity_refs(value.args)
+        yield from _entity_refs(value.keywords)
+
+# Every entity reachable from the root, breadth first
+def _collect_entities(root):
+    entities = [root]
+    seen = set([id(root)])
+
+    i = 0
+    while i < len(entities):
+        for value in entities[i].__getstate__().values():
+            for entity in _entity_refs(value):
+                if id(entity) not in seen:
+                    seen.add(id(entity))
+                    entities.append(entity)
+        i += 1
+
+    return entities
+
+def _python_files(path):
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith(('.', '__pycache__')))
+
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                yield os.path.join(dirpath, filename)
+
+# Files of the description package (or module), None if it cannot be found
+def description_files(source):
+    import importlib.util
+
+    # Only look up the top-level module, this does not execute it
+    spec = importlib.util.find_spec(source.split('.')[0])
+    if spec is None:
+        return None
+
+    files = []
+    if spec.submodule_search_locations is not None:
+        for location in spec.submodule_search_locations:
+            files += _python_files(location)
+    elif spec.origin is not None and os.path.isfile(spec.origin):
+        files.append(spec.origin)
+
+    return files
+
+def source_files(source):
+    import bindgen
+
+    files = description_files(source)
+    if files is None:
+        return None
+
+    return list(_python_files(os.path.dirname(bindgen.__file__))) + files
+
+def fingerprint(source, extra_files=[]):
+    files = source_files(source)
+    if files is None:
+        return None
+
+    h = hashlib.sha256()
+    h.update(('%s\n%d\n%s\n' % (source, SNAPSHOT_VERSION, sys.version)).encode())
+
+    for path in sorted(set(os.path.abspath(path) for path in files + list(extra_files))):
+        h.update(path.encode() + b'\n')
+
+        try:
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            h.update(b'<missing>')
+
+    return h.hexdigest()
+
+def local_modules(names, base='.'):
+    base = os.path.abspath(base)
+
+    modules = {}
+    for name in names:
+        if name == 'bindgen' or name.startswith('bindgen.'):
+            continue
+
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path is not None and os.path.abspath(path).startswith(base + os.sep):
+            modules[name] = os.path.abspath(path)
+
+    return modules
+
+def save(path, root, source, modules={}):
+    header = {
+        'source': source,
+        'extra_files': sorted(modules.values()),
+    }
+    header['fingerprint'] = fingerprint(source, header['extra_files'])
+
+    if header['fingerprint'] is None:
+        raise SnapshotError('Cannot locate the source module %s' % (source))
+
+    tmp_path = '%s.tmp%d' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            _SnapshotPickler(f, set(modules.keys())).dump_tree(root)
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Returns the snapshotted root, or None if it is missing or out of date
+def load(path, source):
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+
+    with f:
+        if f.readline() != SNAPSHOT_MAGIC:
+            return None
+
+        try:
+            header = pickle.load(f)
+        except Exception:
+            return None
+
+        if header.get('source') != source:
+            return None
+        if header.get('fingerprint') != fingerprint(source, header.get('extra_files', [])):
+            return None
+
+        unpickler = pickle.Unpickler(f)
+        entities = unpickler.load()
+        states = unpickler.load()
+
+        for (entity, state) in zip(entities, states):
+            entity.__setstate__(state)
+
+        return entities[0]
@@ -11,3 +11,136 @@ def import_all(root, file):
         if (is_python_module or is_python_script) and not is_init_script:
             modname = os.path.basename(fname).rsplit('.', 1)[0]
             __import__('.'.join([root, modname]))
+
+# Writes `data` to `path` unless the file already holds it, so that unchanged
+# outputs keep their mtime. Returns whether the file was written.
+def write_if_changed(path, data):
+    import hashlib
+    import os
+
+    data = data.encode('utf-8')
+    if file_digest(path) == hashlib.sha256(data).digest():
+        return False
+
+    # Readers never see a partially written file
+    tmp_path = '%s.tmp%d' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return True
+
+# SHA-256 digest of a file's content, None if it cannot be read
+def file_digest(path, block_size=1 << 20):
+    import hashlib
+
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                h.update(block)
+    except OSError:
+        return None
+
+    return h.digest()
+
+# Streaming write_if_changed(): the text is written to a temporary file as it
+# comes, which only replaces `path` on close() if the content changed.
+# close() returns whether the file was written.
+class ChangedFileWriter(object):
+    def __init__(self, path):
+        import hashlib
+        import os
+
+        self.path = path
+        self.tmp_path = '%s.tmp%d' % (path, os.getpid())
+
+        self._file = open(self.tmp_path, 'wb')
+        self._hash = hashlib.sha256()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self._hash.update(data)
+        self._file.write(data)
+
+    def close(self):
+        import os
+
+        self._file.close()
+        try:
+            if file_digest(self.path) == self._hash.digest():
+                return False
+
+            os.replace(self.tmp_path, self.path)
+            return True
+        finally:
+            self.discard()
+
+    # Drops the temporary file, leaving `path` as it was
+    def discard(self):
+        import os
+
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+# Task of the running fork_map(), inherited by its workers
+_fork_tasks = None
+
+# Whether this process is a fork_map() worker. A fork_map() in a worker runs
+# serially, rather than forking `jobs` more processes from each worker.
+_fork_worker = False
+
+def _init_fork_worker():
+    global _fork_worker
+    _fork_worker = True
+
+def _run_fork_task(i):
+    (func, args) = _fork_tasks
+    return func(*args[i])
+
+# Returns [func(*arg) for arg in args], computed by up to `jobs` forked
+# workers. Workers inherit `func` and `args` (only indexes and results are
+# pickled), so they can read any shared state, but their side effects are
+# lost. Runs serially when fork() is not available, or in a worker already.
+def fork_map(func, args, jobs):
+    return list(fork_imap(func, args, jobs))
+
+# Same as fork_map(), but yields the results in order as they come, so the
+# caller can consume each one before the next is needed. Serial runs only
+# compute a result once the previous one was consumed.
+def fork_imap(func, args, jobs):
+    global _fork_tasks
+    import gc
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    args = list(args)
+    if _fork_worker:
+        jobs = 1
+
+    if jobs <= 1 or len(args) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for arg in args:
+            yield func(*arg)
+        return
+
+    previous = _fork_tasks
+    _fork_tasks = (func, args)
+
+    # Keep the collector of the workers off the (copy-on-write) shared objects
+    gc.freeze()
+
+    try:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=min(jobs, len(args)), mp_context=context,
+                                 initializer=_init_fork_worker) as pool:
+            chunksize = max(1, len(args) // (jobs * 4))
+            yield from pool.map(_run_fork_task, range(len(args)), chunksize=chunksize)
+    finally:
+        _fork_tasks = previous
+        gc.unfreeze()
@@ -1,12 +1,24 @@
 #!/usr/bin/env python
-import bindgen
+import bindgen.gen
 import sys
 from argparse import ArgumentParser
 from pathlib import Path
 
-def main(args):
+def load_root(args):
+    from bindgen import snapshot
+    from bindgen.ast import loader
+
+    # Declarative descriptions are loaded directly, no snapshot needed
+    if loader.is_description(args.source):
+        return loader.load(args.source)
+
+    if args.snapshot is not None:
+        root = snapshot.load(str(args.snapshot), args.source)
+        if root is not None:
+            return root
+
     # Load module
-    sys.path.insert(0, '.')
+    modules = set(sys.modules.keys())
     mod = __import__(args.source)
 
     if not hasattr(mod, 'root'):
@@ -14,16 +26,243 @@ def main(args):
         exit(1)
 
     root = getattr(mod, 'root')
-    dest = args.dest
 
-    for Generator in bindgen.gen.GENERATORS:
-        gen = Generator(root)
+    if args.snapshot is not None:
+        loaded = snapshot.local_modules(set(sys.modules.keys()) - modules)
+
+        try:
+            snapshot.save(str(args.snapshot), root, args.source, loaded)
+        except Exception as e:
+            print('Could not snapshot %s: %s' % (args.source, e), file=sys.stderr)
+
+    return root
+
+def generate(root, args, manifest=None, profiler=None):
+    if args.only:
+        root = root.restricted(path.split('::') for path in args.only)
+
+    if profiler is not None:
+        # Sealed up front, rather than by the first generator
+        with profiler.phase('seal'):
+            root.seal()
+            root.hierarchy
+
+    if args.jobs > 1 and len(bindgen.gen.GENERATORS) > 1:
+        results = run_parallel(root, args.dest, manifest, args.jobs, profiler)
+    else:
+        results = [run_generator(Generator, root, args.dest, manifest, args.jobs, profiler) for Generator in bindgen.gen.GENERATORS]
+
+    written = unchanged = 0
+    for result in results:
+        written += result[0]
+        unchanged += result[1]
+
+    if manifest is not None and args.incremental:
+        manifest.save()
+
+    print('%d file(s) written, %d unchanged' % (written, unchanged))
+
+def run_generator(Generator, root, dest, manifest, jobs=1, profiler=None):
+    from bindgen.profile import phase
+
+    gen = Generator(root)
+    gen.manifest = manifest
+    gen.jobs = jobs
+    gen.profiler = profiler
+
+    with phase(profiler, 'generate', generator=Generator.__name__):
         gen.generate(dest)
 
+    return (gen.written, gen.unchanged)
+
+# Runs each generator in its own process. They write distinct files, and
+# their results are merged in GENERATORS order, so the output does not
+# depend on scheduling. Workers are forked: they share the already sealed
+# tree instead of pickling or loading it again. Generators with their own
+# worker pool run here afterwards, with all the jobs.
+def run_parallel(root, dest, manifest, jobs, profiler=None):
+    from bindgen.utils import fork_map
+
+    # Built once here rather than once per worker
+    ir = root.seal()
+    root.hierarchy
+    if manifest is not None:
+        ir.fingerprints
+        ir.opaque
+
+    # The state the workers changed is sent back with their results. A
+    # worker may run several generators, it only sends what each one reused
+    # (and leaves the count as it was, as it may be this process).
+    def run(Generator):
+        reused = 0 if manifest is None else manifest.reused
+
+        worker_profiler = None if profiler is None else type(profiler)()
+        result = run_generator(Generator, root, dest, manifest, jobs, worker_profiler)
+
+        if manifest is not None:
+            (used, manifest.reused) = (manifest.reused - reused, reused)
+            result += (manifest.files, manifest.fragments, used)
+        else:
+            result += (None, None, 0)
+
+        if worker_profiler is not None:
+            result += (worker_profiler.phases,)
+        else:
+            result += (None,)
+
+        return result
+
+    pooled = [Generator for Generator in bindgen.gen.GENERATORS if not Generator.own_pool]
+    pooled_results = dict(zip(pooled, fork_map(run, [(Generator,) for Generator in pooled], jobs)))
+
+    results = []
+    for Generator in bindgen.gen.GENERATORS:
+        if Generator.own_pool:
+            results.append(run_generator(Generator, root, dest, manifest, jobs, profiler))
+            continue
+
+        (written, unchanged, files, fragments, reused, phases) = pooled_results[Generator]
+        if manifest is not None:
+            manifest.files.update(files)
+            manifest.fragments.update(fragments)
+            manifest.reused += reused
+        if profiler is not None:
+            profiler.extend(phases)
+
+        results.append((written, unchanged))
+
+    return results
+
+def main(args):
+    sys.path.insert(0, '.')
+
+    if args.watch:
+        watch(args)
+        return
+
+    manifest = None
+    if args.incremental:
+        from bindgen.gen.manifest import Manifest
+        manifest = Manifest.load(args.dest)
+
+    if args.profile is None and args.cprofile is None and args.memory is None:
+        generate(load_root(args), args, manifest)
+    else:
+        profile(args, manifest)
+
+# Runs the generation with the phase timings, their memory use, and the
+# cProfile statistics, as asked for
+def profile(args, manifest):
+    import cProfile
+    from bindgen.profile import MemoryProfiler, Profiler, phase
+
+    profiler = None
+    if args.memory is not None:
+        profiler = MemoryProfiler()
+    elif args.profile is not None:
+        profiler = Profiler()
+
+    stats = None
+    if args.cprofile is not None:
+        stats = cProfile.Profile()
+        stats.enable()
+
+    try:
+        with phase(profiler, 'import', source=args.source):
+            root = load_root(args)
+
+        generate(root, args, manifest, profiler)
+    finally:
+        if stats is not None:
+            stats.disable()
+            stats.dump_stats(str(args.cprofile))
+
+    if args.profile is not None:
+        profiler.save(args.profile)
+    if args.memory is not None:
+        profiler.save(args.memory)
+
+def mtimes(paths):
+    import os
+
+    times = {}
+    for path in paths:
+        try:
+            times[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            times[path] = None
+    return times
+
+# Regenerates whenever a description file changes. bindgen stays loaded, and
+# the outputs of the previous run are kept in memory (see Manifest), so only
+# what changed is generated again. Description modules build the tree by
+# mutating a shared root, they are all executed again on reload.
+def watch(args, interval=0.5):
+    import time
+    import traceback
+    from bindgen import snapshot
+    from bindgen.ast import loader
+    from bindgen.ast.objects import Module, ty
+    from bindgen.gen.manifest import Manifest
+
+    if args.incremental:
+        manifest = Manifest.load(args.dest)
+    else:
+        manifest = Manifest(args.dest)
+
+    while True:
+        modules = set(sys.modules.keys())
+
+        # Nothing from the previous load is kept: its types, and the Module
+        # subclasses its description defined
+        ty.clear_interned()
+        Module.reset_factories()
+
+        try:
+            generate(load_root(args), args, manifest)
+            manifest.rollover()
+        except Exception:
+            traceback.print_exc()
+
+        # Watch whatever the description loaded, even if it failed halfway
+        loaded = snapshot.local_modules(set(sys.modules.keys()) - modules)
+        if loader.is_description(args.source):
+            files = [args.source]
+        else:
+            files = sorted(set(loaded.values()) | set(snapshot.description_files(args.source) or []))
+
+        print('Watching %d file(s) for changes...' % (len(files)))
+
+        try:
+            times = mtimes(files)
+            while mtimes(files) == times:
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            return
+
+        for name in loaded:
+            del sys.modules[name]
+
 # Main
 parser = ArgumentParser()
-parser.add_argument('source')
+parser.add_argument('source', help='Description module, or .json/.jsonl/.toml description file')
 parser.add_argument('dest', type=Path)
+parser.add_argument('--snapshot', type=Path, metavar='FILE',
+                    help='Cache the built tree in FILE, and reuse it while the sources are unchanged')
+parser.add_argument('--incremental', action='store_true',
+                    help='Keep a manifest in DEST, and only regenerate the parts whose inputs changed')
+parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                    help='Run the generators, and emit the Rust module files, in N worker processes')
+parser.add_argument('--watch', action='store_true',
+                    help='Keep running, and regenerate DEST whenever the description changes')
+parser.add_argument('--only', action='append', metavar='NAMESPACE',
+                    help='Only generate the given namespace (e.g. llvm::sys), can be repeated')
+parser.add_argument('--profile', type=Path, metavar='FILE',
+                    help='Write the time spent in each phase, generator and output file to FILE, as JSON')
+parser.add_argument('--cprofile', type=Path, metavar='FILE',
+                    help='Dump cProfile statistics of the generation to FILE (in this process only, see -j)')
+parser.add_argument('--memory', type=Path, metavar='FILE',
+                    help='Trace memory allocations, and write the peak and retained memory of each phase to FILE, as JSON')
 
 if __name__ == '__main__':
     main(parser.parse_args())